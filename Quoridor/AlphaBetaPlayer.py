@@ -0,0 +1,246 @@
+import logging
+import threading
+import time
+
+import Zobrist
+from QuoridorBoard import PATH_FIRST
+from Symmetry import canonical
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+log = logging.getLogger(__name__)
+
+WIN_SCORE = 100000
+INFINITY = 1000000
+# Values this close to WIN_SCORE are wins found some number of plies from the position
+WIN_BOUND = WIN_SCORE - 1000
+
+# Wins are stored in the transposition table counted from the position, not the root,
+# so they come back right when the position is reached at another ply
+def value_to_tt(value, ply):
+    if value >= WIN_BOUND:
+        return value + ply
+    if value <= -WIN_BOUND:
+        return value - ply
+    return value
+
+def value_from_tt(value, ply):
+    if value >= WIN_BOUND:
+        return value - ply
+    if value <= -WIN_BOUND:
+        return value + ply
+    return value
+
+class SearchTimeout(Exception):
+    pass
+
+class AlphaBetaPlayer():
+    """
+    Negamax alpha-beta search with iterative deepening and a per-move time budget.
+
+    Positions are scored by the difference in shortest path length between the
+    opponents and this player. With four players the search is paranoid: every
+    opponent is assumed to play against us, so consecutive opponent moves keep
+    the same sign. Moves are searched on one board with apply/undo, and a
+    transposition table carries the best move of each position from one depth
+    to the next.
+
+    After each move, last_search_stats holds the depth reached, nodes searched
+    and nodes per second.
+
+    ponder searches a position where an opponent is to move on a background
+    thread, for up to time_limit seconds or until stop_pondering. It only
+    fills the transposition table, so the next search starts with good move
+    ordering and cutoffs below the opponent's actual reply.
+
+    With symmetric_tt=True a two player search keys the transposition table
+    on Symmetry.canonical_hash, so mirrored and turned positions share one
+    entry. Values are for the side to move, which every symmetry keeps. A four
+    player search is paranoid about one seat, which the quarter turns move, so
+    it always keys on the plain hash.
+
+    With four players evaluate and the paranoid signs depend on the seat being
+    searched for, so the table is keyed on that seat too and an agent playing
+    several seats doesn't reuse another seat's values.
+    """
+
+    def __init__(self, game, time_limit = 1.0, max_depth = 20, relevant_fences_only = True, tt_size = 1 << 18, symmetric_tt = False):
+        self.game = game
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        # Only search fences that lengthen an opponent's current shortest path
+        self.relevant_fences_only = relevant_fences_only
+        self.tt = TranspositionTable(tt_size)
+        self.symmetric_tt = symmetric_tt and game.n_players == 2
+        self.last_search_stats = {}
+        self.ponder_thread = None
+        self.pondered_nodes = 0
+
+    def play(self, board, valid_moves):
+        self.stop_pondering()
+        pondered_nodes = self.pondered_nodes
+        self.pondered_nodes = 0
+        if len(valid_moves) == 1:
+            return valid_moves[0]
+
+        self.set_root_player(board.current_player)
+        self.tt.new_search()
+        self.nodes = 0
+        start_time = time.perf_counter()
+        self.deadline = start_time + self.time_limit
+
+        best_move = valid_moves[0]
+        best_value = 0
+        depth_reached = 0
+        # Pawn moves along our shortest path first, then fences by how early they cut an opponent's
+        valid = set(valid_moves)
+        root_moves = [move for move in board.generate_moves(PATH_FIRST, None, self.relevant_fences_only) if move in valid]
+        for depth in range(1, self.max_depth + 1):
+            try:
+                move, value = self.search_root(board, root_moves, depth)
+            except SearchTimeout:
+                break
+            best_move, best_value, depth_reached = move, value, depth
+            # Search the best move first at the next depth
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+            if abs(value) >= WIN_SCORE - self.max_depth:
+                break
+
+        elapsed = time.perf_counter() - start_time
+        self.last_search_stats = {
+            "depth": depth_reached,
+            "nodes": self.nodes,
+            "time": elapsed,
+            "nps": self.nodes / elapsed if elapsed > 0 else 0.0,
+            "value": best_value,
+            "pondered_nodes": pondered_nodes,
+        }
+        log.info("depth %i, %i nodes in %.3fs (%.0f nodes/s), value %i", depth_reached, self.nodes, elapsed, self.last_search_stats["nps"], best_value)
+        return best_move
+
+    # Start searching board, where an opponent is to move, on a background thread
+    # player is the seat this player plays in
+    def ponder(self, board, player):
+        self.stop_pondering()
+        self.set_root_player(player)
+        self.nodes = 0
+        self.deadline = time.perf_counter() + self.time_limit
+        self.ponder_thread = threading.Thread(target=self.ponder_search, args=(board,), daemon=True)
+        self.ponder_thread.start()
+
+    def ponder_search(self, board):
+        for depth in range(1, self.max_depth + 1):
+            try:
+                value = self.negamax(board, depth, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                break
+            if abs(value) >= WIN_SCORE - self.max_depth:
+                break
+
+    # Stop pondering and wait for the search to unwind
+    def stop_pondering(self):
+        if self.ponder_thread is None:
+            return
+        # The search checks the deadline at every node
+        self.deadline = 0
+        self.ponder_thread.join()
+        self.ponder_thread = None
+        self.pondered_nodes += self.nodes
+
+    # The seat positions are scored for, which four player table entries are keyed on
+    def set_root_player(self, player):
+        self.root_player = player
+        self.root_key = Zobrist.root_key(player) if self.game.n_players == 4 else 0
+
+    # Search every root move to depth, returning the best one and its value
+    def search_root(self, board, moves, depth):
+        alpha = -INFINITY
+        best_move = moves[0]
+        for move in moves:
+            board.apply(move)
+            try:
+                # The next player is always on the other side at the root
+                value = -self.negamax(board, depth - 1, -INFINITY, -alpha, 1)
+            finally:
+                board.undo()
+            if value > alpha:
+                alpha = value
+                best_move = move
+        return best_move, alpha
+
+    # Value of the position for the side to move
+    def negamax(self, board, depth, alpha, beta, ply):
+        self.nodes += 1
+        if time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        our_turn = board.current_player == self.root_player
+        sign = 1 if our_turn else -1
+
+        winner = board.get_win_state()
+        if winner != -1:
+            score = WIN_SCORE - ply
+            return sign * (score if winner == self.root_player else -score)
+        if depth == 0:
+            return sign * self.evaluate(board)
+
+        original_alpha = alpha
+        tt_move = None
+        if self.symmetric_tt:
+            # Moves are stored as played on the canonical image
+            tt_key, symmetry = canonical(board)
+        else:
+            tt_key, symmetry = board.hash ^ self.root_key, None
+        entry = self.tt.lookup(tt_key)
+        if entry is not None:
+            tt_move = entry.move if symmetry is None else symmetry.inverse.move(entry.move)
+            if entry.depth >= depth:
+                value = value_from_tt(entry.value, ply)
+                if entry.flag == EXACT:
+                    return value
+                if entry.flag == LOWER_BOUND:
+                    alpha = max(alpha, value)
+                elif entry.flag == UPPER_BOUND:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        best_value = -INFINITY
+        best_move = None
+        # Moves come lazily, so a cutoff skips the path checks of the fences after it
+        for move in board.generate_moves(PATH_FIRST, tt_move, self.relevant_fences_only):
+            board.apply(move)
+            try:
+                if (board.current_player == self.root_player) == our_turn:
+                    value = self.negamax(board, depth - 1, alpha, beta, ply + 1)
+                else:
+                    value = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                board.undo()
+            if value > best_value:
+                best_value = value
+                best_move = move
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        if best_move is None:
+            return sign * self.evaluate(board)
+
+        if best_value <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_value >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.tt.store(tt_key, depth, value_to_tt(best_value, ply), flag, best_move if symmetry is None else symmetry.move(best_move))
+        return best_value
+
+    # Score the position for the root player: opponents' distance to goal minus ours
+    def evaluate(self, board):
+        fields = board.distance_field.get(board)
+        distances = [int(fields[player, pawn.y, pawn.x]) for player, pawn in enumerate(board.pawns)]
+        me = self.root_player
+        opponent = min(distance for player, distance in enumerate(distances) if player != me)
+        opponent_fences = max(fences for player, fences in enumerate(board.fences) if player != me)
+        return 10 * (opponent - distances[me]) + board.fences[me] - opponent_fences
@@ -1,8 +1,16 @@
 import logging
+import math
+import multiprocessing
+import os
+import random
 import time
 
+import numpy as np
 from tqdm import tqdm
 
+from Instrumentation import MOVE_GENERATION, DECISION, TRANSITION, WIN_CHECK
+from QuoridorMove import QuoridorMove
+
 log = logging.getLogger(__name__)
 
 
@@ -11,28 +19,61 @@ class Arena():
     An Arena class where any 2 agents can be pit against each other.
     """
 
-    def __init__(self, players, game):
+    def __init__(self, players, game, instruments=None, ponder=False):
         """
         Input:
-            players: List of players, either two or four
+            players: List of players, one for each of the game's players
             game: Game object
+            instruments: List of Instrumentation.Instrument hooks called during every game
+            ponder: Let agents that support it think while their opponents decide.
+                    Pondering runs on a thread of this process, so an agent only
+                    ponders if every other seat waits for input, like HumanPlayer;
+                    an opponent that computes would share the interpreter with it,
+                    slowing both and skewing their time budgets and decision times
         """
+        if len(players) != game.n_players:
+            raise Exception("%i players given for a %i player game" % (len(players), game.n_players))
         self.players = players
         self.game = game
+        self.instruments = instruments or []
+        self.ponder = ponder
 
-    def playGame(self, verbose=False):
+    def playGame(self, verbose=False, seed=None):
         """
         Executes one episode of a game.
 
+        If seed is given the python and numpy random number generators are
+        seeded with it first.
+
+        Players are called with the board and the list of legal QuoridorMoves,
+        and return one of the moves or its action number from QuoridorActions.
+
+        With ponder=True, agents with ponder and stop_pondering methods are
+        given a copy of the board after every move while another player is
+        to move: agent.ponder(board, seat) starts a search in the background
+        and agent.stop_pondering() ends it. An agent stops pondering itself
+        when asked to play, and keeps what it found for that search. Only an
+        agent whose opponents all have waits_for_input set ponders, as the
+        background search competes with whatever else runs in the process.
+
         Returns
-            res: player who won the game (1 if player1, -1 if player2) or
-                draw result returned from the game that is neither 1, -1, nor 0.
-            average_turn_lengths:
-                average time for each player to decide their moves
+            res: index of the player who won the game
+
+        Afterwards self.decision_times holds the total time each player spent
+        deciding on their moves and self.turns the number of moves they made.
         """
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed % (1 << 32))
         curPlayer = 0
         board = self.game.getInitBoard()
         it = 0
+        self.decision_times = [0.0] * self.game.n_players
+        self.turns = [0] * self.game.n_players
+        names = self.player_names()
+        ponderers = self.ponderers()
+        for instrument in self.instruments:
+            instrument.game_started(board, seed, names)
 
         while True:
             it += 1
@@ -40,68 +81,184 @@ class Arena():
                 print("Turn ", str(it), "Player ", str(curPlayer + 1))
                 self.game.display(board)
 
-            #start_time = time.time()
-            valid_moves = self.game.getValidMoves(board, curPlayer)
-            action = self.players[curPlayer](self.game.getCanonicalForm(board, curPlayer), valid_moves)
-            #decision_time = time.time() - start_time
-
-            #valids = self.game.getValidMoves(self.game.getCanonicalForm(board, curPlayer), curPlayer)
+            player = self.players[curPlayer]
+            valid_moves = self.run_phase(MOVE_GENERATION, curPlayer, board, self.valid_move_list, board, curPlayer)
+            start_time = time.perf_counter()
+            action = self.run_phase(DECISION, curPlayer, board, player, self.game.getCanonicalForm(board, curPlayer), valid_moves)
+            self.decision_times[curPlayer] += time.perf_counter() - start_time
+            self.turns[curPlayer] += 1
+            if not isinstance(action, QuoridorMove):
+                action = self.game.actionToMove(board, int(action))
 
             if not action in valid_moves:
                 log.error(f'Action {action} is not valid!')
                 log.debug(f'valids = {valid_moves}')
-            board, curPlayer = self.game.getNextState(board, curPlayer, action)
-            self.game._base_board = board
-            game_value = self.game.getGameEnded(board)
+            mover = curPlayer
+            board, curPlayer = self.run_phase(TRANSITION, mover, board, self.game.getNextState, board, mover, action)
+            for instrument in self.instruments:
+                instrument.move_played(mover, action)
+            game_value = self.run_phase(WIN_CHECK, mover, board, self.game.getGameEnded, board)
+            for instrument in self.instruments:
+                instrument.turn_finished(mover, getattr(player, "__self__", player))
             if game_value != -1:
                 break
-        #res = curPlayer * self.game.getGameEnded(board, curPlayer)
-        #average_turn_lengths = [total_turn_lengths[0] / ((it + 1) // 2), total_turn_lengths[1] / (it // 2)]
+            for seat, agent in ponderers:
+                if seat != curPlayer:
+                    agent.ponder(self.game.getCanonicalForm(board, seat), seat)
+        for seat, agent in ponderers:
+            agent.stop_pondering()
+        for instrument in self.instruments:
+            instrument.game_finished(game_value)
         if verbose:
             print("Game over: Turn ", str(it), "Result: Player ", str(game_value + 1), " wins!")
             self.game.display(board)
         return game_value
 
-    def playGames(self, num, verbose=False):
+    # Legal moves for a player, as the lazy MoveList, so players that stop early skip fence checks
+    # With instruments attached every move is generated here instead, so the profiles charge
+    # the path checks to move generation rather than to the player's decision
+    def valid_move_list(self, board, player):
+        moves = self.game.getValidMoveList(board, player)
+        if self.instruments:
+            moves.finish()
+        return moves
+
+    # Name of each player: the class of the agent whose method plays, or the function's name
+    def player_names(self):
+        names = []
+        for player in self.players:
+            if hasattr(player, "__self__"):
+                names.append(type(player.__self__).__name__)
+            else:
+                names.append(getattr(player, "__name__", type(player).__name__))
+        return names
+
+    # (seat, agent) of every agent that can ponder, if pondering is on
+    # Every other seat has to wait for input rather than compute, which also leaves out an
+    # agent playing more than one seat, as it can only think about one position at a time
+    def ponderers(self):
+        if not self.ponder:
+            return []
+        agents = [getattr(player, "__self__", player) for player in self.players]
+        return [(seat, agent) for seat, agent in enumerate(agents)
+                if hasattr(agent, "ponder") and all(getattr(other, "waits_for_input", False)
+                                                    for other_seat, other in enumerate(agents) if other_seat != seat)]
+
+    # Call fn(*args), telling the instruments when the phase starts and how long it took
+    def run_phase(self, phase, player, board, fn, *args):
+        if not self.instruments:
+            return fn(*args)
+        for instrument in self.instruments:
+            instrument.before(phase, player, board)
+        start_time = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start_time
+        for instrument in self.instruments:
+            instrument.after(phase, player, board, elapsed)
+        return result
+
+    def playGames(self, num, verbose=False, processes=None, seed=0):
         """
-        Plays num games in which player1 starts num/2 games and player2 starts
-        num/2 games.
+        Plays num games spread over a pool of worker processes. Players change
+        seats from game to game so each of them starts equally often: two
+        players swap sides, four players rotate round the board.
 
-        Returns:
-            oneWon: games won by player1
-            twoWon: games won by player2
-            draws:  games won by nobody
+        Every game gets its own seed for the python and numpy random number
+        generators, derived from seed and the game number, so a tournament is
+        reproducible however the games are shared out between workers.
+        processes=1 plays every game in this process, which is needed when the
+        game is being visualized or has a renderer.
+
+        Every game gets fresh instruments from the arena's instruments, which
+        collect the results afterwards with their merge method.
+
+        Returns a dict with:
+            games:            number of games played
+            wins:             games won by each player
+            draws:            games won by nobody
+            win_rates:        fraction of games won by each player
+            confidence_intervals: 95% Wilson score interval of each win rate
+            average_times:    average time each player took per move
         """
+        n_players = self.game.n_players
+        tasks = [(game_index, seating(game_index, n_players), seed + game_index) for game_index in range(num)]
+
+        if processes == 1:
+            init_worker(self.players, self.game, verbose, self.instruments, self.ponder)
+            results = map(play_seated_game, tasks)
+        else:
+            pool = multiprocessing.Pool(processes or os.cpu_count(), initializer=init_worker, initargs=(self.players, self.game, verbose, self.instruments, self.ponder))
+            results = pool.imap_unordered(play_seated_game, tasks)
 
-        num = int(num / 2)
-        oneWon = 0
-        twoWon = 0
+        wins = [0] * n_players
         draws = 0
-        average_times = [0, 0]
-        for _ in tqdm(range(num), desc="Arena.playGames (1)"):
-            gameResult, game_average_times = self.playGame(verbose=verbose)
-            if gameResult == 1:
-                oneWon += 1
-            elif gameResult == -1:
-                twoWon += 1
-            else:
-                draws += 1
-            average_times[0] += game_average_times[0]
-            average_times[1] += game_average_times[1]
-
-        self.player1, self.player2 = self.player2, self.player1
-        print("Swapping sides!")
-
-        for _ in tqdm(range(num), desc="Arena.playGames (2)"):
-            gameResult, game_average_times = self.playGame(verbose=verbose)
-            if gameResult == -1:
-                oneWon += 1
-            elif gameResult == 1:
-                twoWon += 1
-            else:
-                draws += 1
-            average_times[0] += game_average_times[1]
-            average_times[1] += game_average_times[0]
-        average_times[0] /= num * 2
-        average_times[1] /= num * 2
-        return oneWon, twoWon, draws, average_times
+        decision_times = [0.0] * n_players
+        turns = [0] * n_players
+        try:
+            for game_index, seats, winner, game_decision_times, game_turns, game_instruments in tqdm(results, total=num, desc="Arena.playGames"):
+                if 0 <= winner < n_players:
+                    wins[seats[winner]] += 1
+                else:
+                    draws += 1
+                for seat, player in enumerate(seats):
+                    decision_times[player] += game_decision_times[seat]
+                    turns[player] += game_turns[seat]
+                for instrument, game_instrument in zip(self.instruments, game_instruments):
+                    instrument.merge(game_instrument, seats, game_index)
+        except BaseException:
+            # Games still running would keep close and join waiting, so stop the workers outright
+            if processes != 1:
+                pool.terminate()
+                pool.join()
+            raise
+        if processes != 1:
+            pool.close()
+            pool.join()
+
+        return {
+            "games": num,
+            "wins": wins,
+            "draws": draws,
+            "win_rates": [won / num if num else 0.0 for won in wins],
+            "confidence_intervals": [wilson_interval(won, num) for won in wins],
+            "average_times": [decision_times[player] / turns[player] if turns[player] else 0.0 for player in range(n_players)],
+        }
+
+# Which player sits in each seat for a game: players take turns going first
+def seating(game_index, n_players):
+    shift = game_index % n_players
+    return [(seat + shift) % n_players for seat in range(n_players)]
+
+# 95% Wilson score interval for a win rate
+def wilson_interval(wins, games, z=1.96):
+    if games == 0:
+        return (0.0, 1.0)
+    p = wins / games
+    denominator = 1 + z * z / games
+    centre = (p + z * z / (2 * games)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / denominator
+    return (max(0.0, centre - half_width), min(1.0, centre + half_width))
+
+# Each worker process gets its own copy of the players and the game
+_worker_players = None
+_worker_game = None
+_worker_verbose = False
+_worker_instruments = []
+_worker_ponder = False
+
+def init_worker(players, game, verbose, instruments=(), ponder=False):
+    global _worker_players, _worker_game, _worker_verbose, _worker_instruments, _worker_ponder
+    _worker_players = players
+    _worker_game = game
+    _worker_verbose = verbose
+    _worker_instruments = instruments
+    _worker_ponder = ponder
+
+# Play one game in a worker, returning the game number, the seating, the winning seat,
+# time spent and moves made per seat, and the game's instruments
+def play_seated_game(task):
+    game_index, seats, game_seed = task
+    instruments = [instrument.spawn() for instrument in _worker_instruments]
+    arena = Arena([_worker_players[player] for player in seats], _worker_game, instruments, _worker_ponder)
+    winner = arena.playGame(verbose=_worker_verbose, seed=game_seed)
+    return game_index, seats, winner, arena.decision_times, arena.turns, instruments
@@ -0,0 +1,187 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from Arena import Arena
+from QuoridorBoard import Fence
+from QuoridorGame import QuoridorGame
+from RandomPlayer import RandomPlayer
+
+"""
+Benchmarks for the board's hot paths and for whole games.
+
+Every position is built from a fixed seed, so runs on different commits time
+the same work. Results are written as JSON; pass an earlier file to --compare
+to see what got faster or slower.
+
+    python Benchmark.py --output before.json
+    python Benchmark.py --output after.json --compare before.json
+"""
+
+# Fences on the board in each benchmark position
+STAGES = {"opening": 0, "midgame": 10, "lategame": 20}
+
+# Build a position with n_fences fences placed by seeded random play
+# Returns the moves leading to it, so every run can replay the same position
+def position_moves(n_players, n_fences, seed):
+    rng = random.Random(seed)
+    board = QuoridorGame(n_players).newBoard()
+    moves = []
+    placed = 0
+    while placed < n_fences or len(moves) < 2 * n_players:
+        player = board.current_player
+        target = board.get_target(player)
+        pawn_moves = [move for move in board.get_legal_moves_for_player(player) if not target(move.coord)]
+        fences = board.get_legal_fences(player) if placed < n_fences else []
+        if fences and (not pawn_moves or rng.random() < 0.5):
+            move = rng.choice(fences)
+            placed += 1
+        elif pawn_moves:
+            move = rng.choice(pawn_moves)
+        else:
+            raise Exception("No move found while building a benchmark position")
+        board.apply(move)
+        moves.append(move)
+    return moves
+
+def build_position(game, moves):
+    board = game.newBoard()
+    for move in moves:
+        board.apply(move)
+    # Start without a history, like a board handed to a player
+    board.undo_stack = []
+    return board
+
+# Time fn repeat times, calling setup untimed before each run
+def time_call(fn, repeat, setup = None):
+    times = []
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"median_us": statistics.median(times) * 1e6, "min_us": min(times) * 1e6, "runs": repeat}
+
+# Time every hot path on one position
+# The reachability cache is cleared before the fence timings, so they include finding the paths
+def time_position(game, board, repeat):
+    player = board.current_player
+    cold = board.reachability.invalidate
+    # Once every fence is down the fence paths would return at once, so lend
+    # the player a fence to time the search over the full board
+    out_of_fences = board.fences[player] == 0
+    if out_of_fences:
+        board.fences[player] = 1
+    # Every fence that fits, before the path check
+    check_possible = board.check_possible
+    board.check_possible = False
+    fences = [Fence(move.coord, move.is_horizontal) for move in board.get_legal_fences(player)]
+    board.check_possible = check_possible
+    valid_moves = board.get_valid_moves()
+    pawn_move = board.get_legal_moves_for_player(player)[0]
+
+    def check_all():
+        for fence in fences:
+            board.check_if_possible(fence)
+
+    def apply_undo():
+        board.apply(pawn_move)
+        board.undo()
+
+    results = {
+        "get_legal_move_positions": time_call(lambda: board.get_legal_move_positions_for_player(player), repeat),
+        "get_legal_fences": time_call(lambda: board.get_legal_fences(player), repeat, cold),
+        "check_if_possible_all": time_call(check_all, repeat, cold),
+        "get_valid_moves": time_call(board.get_valid_moves, repeat, cold),
+        "getNextState": time_call(lambda: game.getNextState(board, player, pawn_move), repeat),
+        "apply_undo": time_call(apply_undo, repeat),
+    }
+    if out_of_fences:
+        board.fences[player] = 0
+    results["check_if_possible_all"]["candidates"] = len(fences)
+    results["get_valid_moves"]["moves"] = len(valid_moves)
+    return results
+
+# Plies per second of random players through Arena.playGame
+def time_arena(game, n_games, seed):
+    players = [RandomPlayer(game).play for player in range(game.n_players)]
+    arena = Arena(players, game)
+    plies = 0
+    start = time.perf_counter()
+    for game_index in range(n_games):
+        random.seed(seed + game_index)
+        np.random.seed(seed + game_index)
+        arena.playGame()
+        plies += sum(arena.turns)
+    elapsed = time.perf_counter() - start
+    return {"games": n_games, "plies": plies, "seconds": elapsed, "plies_per_second": plies / elapsed}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(player_counts, repeat, n_games, seed):
+    results = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": seed,
+        "positions": {},
+        "arena": {},
+    }
+    for n_players in player_counts:
+        for stage, n_fences in STAGES.items():
+            name = "%ip/%s" % (n_players, stage)
+            moves = position_moves(n_players, n_fences, seed)
+            game = QuoridorGame(n_players)
+            board = build_position(game, moves)
+            results["positions"][name] = time_position(game, board, repeat)
+            print("%-14s fences %5.0fus  valid moves %6.0fus" % (name,
+                  results["positions"][name]["get_legal_fences"]["median_us"],
+                  results["positions"][name]["get_valid_moves"]["median_us"]))
+        name = "%ip" % n_players
+        results["arena"][name] = time_arena(QuoridorGame(n_players), n_games, seed)
+        print("%-14s %.0f plies/s" % ("arena " + name, results["arena"][name]["plies_per_second"]))
+    return results
+
+# Print the ratio old / new of every timing found in both results
+def compare(old, new):
+    print("\n%-50s %12s %12s %8s" % ("", "old", "new", "speedup"))
+    for name, paths in new["positions"].items():
+        for path, timing in paths.items():
+            previous = old.get("positions", {}).get(name, {}).get(path)
+            if previous:
+                print("%-50s %10.0fus %10.0fus %7.2fx" % ("%s %s" % (name, path), previous["median_us"], timing["median_us"], previous["median_us"] / timing["median_us"]))
+    for name, timing in new["arena"].items():
+        previous = old.get("arena", {}).get(name)
+        if previous:
+            print("%-50s %8.0fply/s %8.0fply/s %7.2fx" % ("arena %s" % name, previous["plies_per_second"], timing["plies_per_second"], timing["plies_per_second"] / previous["plies_per_second"]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time Quoridor board operations and games")
+    parser.add_argument("--players", type=int, choices=[2, 4], nargs="+", default=[2, 4])
+    parser.add_argument("--repeat", type=int, default=20, help="runs per timing")
+    parser.add_argument("--games", type=int, default=10, help="random games per Arena timing")
+    parser.add_argument("--seed", type=int, default=2022)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    results = run(args.players, args.repeat, args.games, args.seed)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), results)
@@ -1,17 +1,43 @@
 class Coordinate():
     """
     Simple 2-D integer coordinate class
+
+    Coordinates can't be changed once made. The squares of the board and the
+    ring of squares just off it are made once and shared, so Coordinate(x, y)
+    for those returns the same object every time.
     """
 
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
+    __slots__ = ("x", "y", "_hash")
+
+    def __new__(cls, x, y):
+        if -2 <= x <= 10 and -2 <= y <= 10:
+            coord = _INTERNED[(y + 2) * 13 + x + 2]
+            if coord is not None:
+                return coord
+        coord = object.__new__(cls)
+        object.__setattr__(coord, "x", x)
+        object.__setattr__(coord, "y", y)
+        object.__setattr__(coord, "_hash", hash((x, y)))
+        return coord
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Coordinate is immutable")
+
+    # Shared and immutable, so copies are the object itself
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (Coordinate, (self.x, self.y))
 
     def straight_line_distance(self, other):
         if self.x == other.x:
-           return math.abs(self.y - other.y)
+           return abs(self.y - other.y)
         elif self.y == other.y:
-           return math.abs(self.x - other.x)
+           return abs(self.x - other.x)
         else:
            return 0
 
@@ -24,10 +50,18 @@ class Coordinate():
            return False
 
     def __eq__(self, other):
-        return self.x == other.x and self.y == other.y
+        return self is other or (self.x == other.x and self.y == other.y)
 
     def __hash__(self):
-        return hash((self.x, self.y))
+        return self._hash
+
+    def __repr__(self):
+        return "Coordinate(%i, %i)" % (self.x, self.y)
 
     def is_legal(self):
         return self.x >= 0 and self.x < 9 and self.y >= 0 and self.y < 9
+
+# Shared coordinates for x and y from -2 to 10, indexed (y + 2) * 13 + x + 2
+_INTERNED = [None] * (13 * 13)
+for _index in range(13 * 13):
+    _INTERNED[_index] = Coordinate(_index % 13 - 2, _index // 13 - 2)
@@ -0,0 +1,118 @@
+import numpy as np
+
+# Distance given to squares that can't reach the goal
+UNREACHABLE = 81
+
+# goal_masks(n)[player, y, x] is True for the squares that win the game for player
+def goal_masks(n_players):
+    goals = np.zeros((n_players, 9, 9), dtype=bool)
+    goals[0, 8, :] = True
+    if n_players == 2:
+        goals[1, 0, :] = True
+    else:
+        goals[1, :, 8] = True
+        goals[2, 0, :] = True
+        goals[3, :, 0] = True
+    return goals
+
+GOALS = {2: goal_masks(2), 4: goal_masks(4)}
+
+# The same goals as 81-bit integers, bit y * 9 + x for square (x, y)
+def pack_cells(cells):
+    return int.from_bytes(np.packbits(cells.reshape(-1), bitorder='little').tobytes(), 'little')
+
+GOAL_BITS = {n_players: [pack_cells(goals) for goals in GOALS[n_players]] for n_players in GOALS}
+
+ALL_CELLS = (1 << 81) - 1
+LAST_ROW = pack_cells(np.arange(81) // 9 == 8)
+LAST_COLUMN = pack_cells(np.arange(81) % 9 == 8)
+
+# Open edges of a board as 81-bit integers (open_south, open_east)
+# Bit y * 9 + x of open_south is set if the move from (x, y) to (x, y + 1) is open,
+# and of open_east if the move from (x, y) to (x + 1, y) is open
+def open_edges(board):
+    open_south = ALL_CELLS & ~LAST_ROW
+    open_east = ALL_CELLS & ~LAST_COLUMN
+    for fence in board.horizontal_fences:
+        cell = (fence.first.y - 1) * 9 + fence.first.x
+        open_south &= ~(3 << cell)
+    for fence in board.vertical_fences:
+        cell = fence.first.y * 9 + fence.first.x - 1
+        open_east &= ~((1 << cell) | (1 << (cell + 9)))
+    return open_south, open_east
+
+# Squares one step from seen over the open edges, as 81-bit integers
+# Also works on several 81-bit lanes at once, with the edge masks copied into each lane
+def neighbours(seen, open_south, open_east):
+    return ((seen & open_south) << 9) | ((seen >> 9) & open_south) | ((seen & open_east) << 1) | ((seen >> 1) & open_east)
+
+# Distance from every square to every player's goal, ignoring pawns, as (n_players, 9, 9)
+# Each player's search runs on 81-bit integers, one breadth first layer at a time,
+# and the layers are turned into distances with one NumPy pass at the end
+def compute_fields(board):
+    open_south, open_east = board.edge_masks()
+    n_players = len(board.pawns)
+    fields = np.empty((n_players, 9, 9), dtype=np.int16)
+    for player, goal in enumerate(GOAL_BITS[n_players]):
+        layers = [goal]
+        seen = goal
+        while True:
+            new = seen | neighbours(seen, open_south, open_east)
+            if new == seen:
+                break
+            layers.append(new)
+            seen = new
+        data = b"".join(layer.to_bytes(11, 'little') for layer in layers)
+        reached = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder='little').reshape(len(layers), 88)[:, :81]
+        # A square's distance is the number of layers that don't reach it yet
+        distance = len(layers) - reached.sum(axis=0, dtype=np.int16)
+        distance[reached[-1] == 0] = UNREACHABLE
+        fields[player] = distance.reshape(9, 9)
+    fields.setflags(write=False)
+    return fields
+
+class DistanceField:
+    """
+    Every player's distance to goal from every square, cached by fence layout.
+
+    Distances ignore pawns, so the fields only change when a fence is placed
+    or taken back. They are stored
+    by the board's fence_hash, and positions reached again during a search,
+    or that differ only in pawn positions, reuse them. A field can be read
+    in constant time: field(board, player)[y, x].
+
+    The fields are read-only and depend only on the fences, so copies of a
+    board share one cache.
+    """
+
+    def __init__(self, max_entries = 1 << 14):
+        self.max_entries = max_entries
+        self.fields = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __deepcopy__(self, memo):
+        return self
+
+    # Distance fields of all players for the board's fences, as (n_players, 9, 9)
+    def get(self, board):
+        key = (board.fence_hash, len(board.pawns))
+        fields = self.fields.get(key)
+        if fields is None:
+            self.misses += 1
+            if len(self.fields) >= self.max_entries:
+                self.fields = {}
+            fields = compute_fields(board)
+            self.fields[key] = fields
+        else:
+            self.hits += 1
+        return fields
+
+    # Distance to goal of a player from every square, as a (9, 9) grid indexed [y, x]
+    def field(self, board, player):
+        return self.get(board)[player]
+
+    # Number of steps a player's pawn needs to reach their goal, or UNREACHABLE
+    def distance(self, board, player):
+        pawn = board.pawns[player]
+        return int(self.get(board)[player, pawn.y, pawn.x])
@@ -0,0 +1,161 @@
+"""
+Path checks for several players at once, on integer masks of the 81 cells.
+
+Each player gets an 81-bit lane of one integer, lane k holding bit
+81 * k + y * 9 + x for square (x, y). A breadth first layer of every lane is
+then a handful of shifts and ands against the open edge masks of
+QuoridorBoard.edge_masks, copied into each lane. Shifting never carries a
+bit into the next lane, because the edges leaving the last row and column
+are never open.
+
+The search follows the pawn moves of the game: steps go to free squares
+only, and a pawn in the way is jumped over, straight if it can be and to
+the sides if not. Jumps depend only on where the pawns stand, so each is a
+table entry, the squares next to a pawn and where jumping from there lands.
+"""
+
+from DistanceField import ALL_CELLS, GOAL_BITS, neighbours
+
+LANE = 81
+MAX_LANES = 4
+# LANE_ONES[n] has the lowest bit of each of n lanes set, so mask * LANE_ONES[n] copies mask into every lane
+LANE_ONES = [sum(1 << (LANE * lane) for lane in range(n)) for n in range(MAX_LANES + 1)]
+LANE_MASKS = [ALL_CELLS << (LANE * lane) for lane in range(MAX_LANES)]
+
+# Check if the edge from (x, y) to (x + dx, y + dy) is open; both squares must be on the board
+def edge_open(open_south, open_east, x, y, dx, dy):
+    if dy:
+        return (open_south >> ((y + min(dy, 0)) * 9 + x)) & 1
+    return (open_east >> (y * 9 + x + min(dx, 0))) & 1
+
+def on_board(x, y):
+    return 0 <= x < 9 and 0 <= y < 9
+
+# Squares the pawns stand on, as an 81-bit integer
+def pawn_cells(pawns):
+    cells = 0
+    for pawn in pawns:
+        cells |= 1 << (pawn.y * 9 + pawn.x)
+    return cells
+
+# Jumps over the pawns on occupied, as a list of (cell next to a pawn, mask of the squares jumping from it lands on)
+def jump_table(open_south, open_east, occupied):
+    jumps = []
+    for pawn in range(LANE):
+        if not (occupied >> pawn) & 1:
+            continue
+        x, y = pawn % 9, pawn // 9
+        for dx, dy in ((-1, 0), (0, -1), (1, 0), (0, 1)):
+            # Coming from (x - dx, y - dy) and jumping towards (x + dx, y + dy)
+            if not on_board(x - dx, y - dy) or not on_board(x + dx, y + dy):
+                continue
+            if not edge_open(open_south, open_east, x - dx, y - dy, dx, dy):
+                continue
+            target = (y + dy) * 9 + x + dx
+            if edge_open(open_south, open_east, x, y, dx, dy) and not (occupied >> target) & 1:
+                targets = 1 << target
+            else:
+                targets = 0
+                for sx, sy in ((dy, dx), (-dy, -dx)):
+                    side = (y + sy) * 9 + x + sx
+                    if on_board(x + sx, y + sy) and edge_open(open_south, open_east, x, y, sx, sy) and not (occupied >> side) & 1:
+                        targets |= 1 << side
+            if targets:
+                jumps.append(((y - dy) * 9 + x - dx, targets))
+    return jumps
+
+# Check if every start cell reaches its goal mask, searching all of them together
+def all_reach_goals(starts, goals, open_south, open_east, occupied, jumps):
+    n_lanes = len(starts)
+    ones = LANE_ONES[n_lanes]
+    south = open_south * ones
+    east = open_east * ones
+    free = (ALL_CELLS & ~occupied) * ones
+    seen = 0
+    goal = 0
+    for lane, (start, goal_bits) in enumerate(zip(starts, goals)):
+        seen |= 1 << (LANE * lane + start)
+        # Pawns never land on an occupied square, so those never count as reaching the goal
+        goal |= (goal_bits & ~occupied) << (LANE * lane)
+    approach = 0
+    for cell, targets in jumps:
+        approach |= 1 << cell
+    approach *= ones
+    while True:
+        reached = seen & goal
+        if reached:
+            # A lane that got to its goal is done with; clear it so it stops growing
+            for lane in range(n_lanes):
+                if reached & LANE_MASKS[lane]:
+                    seen &= ~LANE_MASKS[lane]
+            if not seen:
+                return True
+        new = seen | (neighbours(seen, south, east) & free)
+        if seen & approach:
+            for cell, targets in jumps:
+                lanes = (seen >> cell) & ones
+                if lanes:
+                    new |= lanes * targets
+        if new == seen:
+            return False
+        seen = new
+
+class PositionCache:
+    """
+    Entries computed from a position's fence layout and pawn squares, cached
+    by them and by any extra arguments. Subclasses say how to compute an entry.
+
+    The entries depend only on what their key describes, so copies of a board
+    share one cache, as with DistanceField. The cache starts again empty once
+    it holds max_entries.
+    """
+
+    def __init__(self, max_entries = 1 << 12):
+        self.max_entries = max_entries
+        self.entries = {}
+
+    def __deepcopy__(self, memo):
+        return self
+
+    # Entry of the current position, computed by compute(board, *args) if not cached
+    def entry(self, board, *args):
+        key = (board.fence_hash, tuple(board.pawns)) + args
+        entry = self.entries.get(key)
+        if entry is None:
+            if len(self.entries) >= self.max_entries:
+                self.entries = {}
+            entry = self.compute(board, *args)
+            self.entries[key] = entry
+        return entry
+
+    # The entry of the current position; subclasses define it
+    def compute(self, board, *args):
+        raise Exception("%s does not say how to compute its entries" % type(self).__name__)
+
+class FloodFill(PositionCache):
+    """
+    Checks fences with all_reach_goals, keeping the open edges, pawn squares
+    and jump table of each position it has seen.
+    """
+
+    # (open_south, open_east, occupied, jumps) of the current position
+    def compute(self, board):
+        open_south, open_east = board.edge_masks()
+        occupied = pawn_cells(board.pawns)
+        return (open_south, open_east, occupied, jump_table(open_south, open_east, occupied))
+
+    # Check if all the players can still get to their goal with a fence added at (is_horizontal, x, y)
+    def players_reach_goals(self, board, players, is_horizontal, x, y):
+        open_south, open_east, occupied, jumps = self.entry(board)
+        if is_horizontal:
+            cell = (y - 1) * 9 + x
+            open_south &= ~(3 << cell)
+        else:
+            cell = y * 9 + x - 1
+            open_east &= ~((1 << cell) | (1 << (cell + 9)))
+        # The fence only changes jumps over pawns on the four squares around its middle
+        if occupied & (0b11 << cell | 0b11 << (cell + 9)):
+            jumps = jump_table(open_south, open_east, occupied)
+        goals = GOAL_BITS[len(board.pawns)]
+        return all_reach_goals([board.pawns[player].y * 9 + board.pawns[player].x for player in players],
+                               [goals[player] for player in players], open_south, open_east, occupied, jumps)
@@ -0,0 +1,227 @@
+"""
+Compact binary game records.
+
+A record file starts with the 4 byte magic b"QRGR" and a version byte,
+followed by any number of games. Each game is:
+
+    uint32   length of the rest of the game in bytes
+    uint8    number of players
+    int8     winning seat, or -1 if nobody won
+    uint64   seed the game was played with
+    uint16   number of moves
+    names    per seat, a uint8 length then that many bytes of UTF-8
+    moves    one byte per move
+
+Moves are numbered from the square or fence slot they use:
+    0 - 127:    fence in the slot QuoridorBoard.fence_slot gives it, horizontal
+                (y - 1) * 8 + x and vertical 64 + y * 8 + x - 1
+    128 - 208:  pawn move to square y * 9 + x
+Players take turns in seat order, so who made a move is never stored.
+
+All numbers are little endian. Because every game starts with its length,
+the reader can skip through a memory mapped file without decoding the moves.
+"""
+
+import mmap
+import struct
+from collections import namedtuple
+
+from Instrumentation import Instrument
+from QuoridorBoard import Fence, FENCE_SLOTS, COORDS, fence_slot
+from QuoridorMove import QuoridorMove, QuoridorMoveType
+
+MAGIC = b"QRGR"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sB")
+GAME_LENGTH = struct.Struct("<I")
+GAME_HEADER = struct.Struct("<BbQH")
+PAWN_BASE = 128
+
+Game = namedtuple("Game", ["n_players", "winner", "seed", "names", "moves"])
+
+def encode_move(move):
+    if move.type == QuoridorMoveType.MOVE:
+        return PAWN_BASE + move.coord.y * 9 + move.coord.x
+    return fence_slot(Fence(move.coord, move.is_horizontal))
+
+def decode_move(code, player):
+    if code >= PAWN_BASE:
+        return QuoridorMove.move_pawn(COORDS[code - PAWN_BASE], player)
+    return QuoridorMove.add_fence(FENCE_SLOTS[code], player)
+
+# Bytes of one game, length prefix included
+def encode_game(n_players, winner, seed, names, moves):
+    body = bytearray(GAME_HEADER.pack(n_players, winner, (seed or 0) & 0xFFFFFFFFFFFFFFFF, len(moves)))
+    for name in names:
+        encoded = name.encode("utf-8")[:255]
+        body.append(len(encoded))
+        body += encoded
+    body += moves
+    return GAME_LENGTH.pack(len(body)) + body
+
+class GameRecordWriter():
+    """
+    Appends games to a record file as they finish.
+
+    Games are written through a buffered file, so call flush or close (or
+    use the writer in a with block) to be sure they reach the disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION))
+        else:
+            with open(path, "rb") as existing:
+                check_header(existing.read(FILE_HEADER.size))
+        self.games = 0
+
+    # moves is a bytes-like object of encoded moves
+    def write_game(self, n_players, winner, seed, names, moves):
+        self.file.write(encode_game(n_players, winner, seed, names, moves))
+        self.games += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class GameRecordReader():
+    """
+    Reads games from a record file through a memory map.
+
+    Iterating yields one Game at a time and only touches the pages it reads,
+    so files with millions of games can be scanned in constant memory. The
+    moves of a Game are bytes, one per move. Indexing with reader[i] builds
+    an index of game offsets the first time it is used.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        check_header(self.map[:FILE_HEADER.size])
+        self.offsets = None
+
+    def __iter__(self):
+        offset = FILE_HEADER.size
+        size = len(self.map)
+        while offset < size:
+            game, offset = self.read_game(offset)
+            yield game
+
+    # Decode the game starting at offset; returns the game and the offset of the next one
+    def read_game(self, offset):
+        length, = GAME_LENGTH.unpack_from(self.map, offset)
+        start = offset + GAME_LENGTH.size
+        n_players, winner, seed, n_moves = GAME_HEADER.unpack_from(self.map, start)
+        position = start + GAME_HEADER.size
+        names = []
+        for seat in range(n_players):
+            name_length = self.map[position]
+            names.append(bytes(self.map[position + 1:position + 1 + name_length]).decode("utf-8"))
+            position += 1 + name_length
+        moves = self.map[position:position + n_moves]
+        return Game(n_players, winner, seed, names, moves), start + length
+
+    def build_index(self):
+        self.offsets = []
+        offset = FILE_HEADER.size
+        size = len(self.map)
+        while offset < size:
+            self.offsets.append(offset)
+            length, = GAME_LENGTH.unpack_from(self.map, offset)
+            offset += GAME_LENGTH.size + length
+
+    def __len__(self):
+        if self.offsets is None:
+            self.build_index()
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if self.offsets is None:
+            self.build_index()
+        return self.read_game(self.offsets[index])[0]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Play a recorded game on a new board from new_board(n_players)
+# Yields the board after each move together with the move, so the same board is reused
+def replay(game, new_board):
+    board = new_board(game.n_players)
+    for code in game.moves:
+        move = decode_move(code, board.current_player)
+        board.apply(move)
+        yield board, move
+
+class GameRecorder(Instrument):
+    """
+    Arena instrument that records every game it sees.
+
+    Give it a path to stream finished games into that file. With
+    Arena.playGames the games are recorded in the worker processes and
+    written by the recorder in the main process as they come back.
+    """
+
+    def __init__(self, path = None):
+        self.writer = GameRecordWriter(path) if path is not None else None
+        self.finished = []
+        self.moves = None
+
+    def spawn(self):
+        return GameRecorder()
+
+    # Open files don't travel to worker processes; their recorders come from spawn anyway
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["writer"] = None
+        return state
+
+    def game_started(self, board, seed, names):
+        self.n_players = len(board.pawns)
+        self.seed = seed
+        self.names = names
+        self.moves = bytearray()
+
+    def move_played(self, player, move):
+        self.moves.append(encode_move(move))
+
+    def game_finished(self, winner):
+        self.add_game((self.n_players, winner, self.seed, self.names, bytes(self.moves)))
+
+    def add_game(self, game):
+        if self.writer is not None:
+            self.writer.write_game(*game)
+        else:
+            self.finished.append(game)
+
+    def merge(self, other, seats, game_index):
+        for game in other.finished:
+            self.add_game(game)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+def check_header(header):
+    magic, version = FILE_HEADER.unpack(header)
+    if magic != MAGIC:
+        raise Exception("Not a Quoridor game record file")
+    if version != VERSION:
+        raise Exception("Unsupported game record version: %i" % version)
@@ -0,0 +1,148 @@
+"""
+Draws boards to files without opening a window.
+
+HeadlessRenderer can stand in for QuoridorVisualizer: give it to
+QuoridorGame(renderer=...) and every board the game displays is written to
+a numbered frame in a directory, either as an ASCII drawing or as a PNG.
+Neither needs pygame or a display. draw_board only copies what the frame
+shows; the drawing and writing happen on a background thread, so the game
+loop doesn't wait for the disk.
+
+    renderer = HeadlessRenderer("frames", "png")
+    game = QuoridorGame(renderer=renderer)
+    Arena(players, game).playGame(verbose=True)
+    renderer.close()
+"""
+
+import os
+import queue
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+from QuoridorVisualizer import BLACK, WHITE, COLORS, FENCE_COLOR, FENCE_WIDTH, ROWS
+
+FORMATS = {"ascii": "txt", "png": "png"}
+
+# Pixels per square in PNG frames, and height of the bar showing whose turn it is
+CELL = 24
+BAR = 6
+SIZE = ROWS * CELL + 1
+
+# The parts of a board a frame shows, copied so the game can carry on while the frame is drawn
+def snapshot(board):
+    return (tuple((pawn.x, pawn.y) for pawn in board.pawns),
+            tuple((fence.first.x, fence.first.y) for fence in board.horizontal_fences),
+            tuple((fence.first.x, fence.first.y) for fence in board.vertical_fences),
+            board.current_player,
+            tuple(board.fences))
+
+# Squares are three characters wide with a character between them; fences are drawn with #
+def ascii_frame(frame):
+    pawns, horizontal, vertical, current_player, fences = frame
+    width = 4 * ROWS + 1
+    grid = [[" "] * width for row in range(2 * ROWS + 1)]
+    for row in range(0, 2 * ROWS + 1, 2):
+        for column in range(0, width, 4):
+            grid[row][column] = "+"
+    for column in range(1, width - 1):
+        if column % 4:
+            grid[0][column] = grid[2 * ROWS][column] = "-"
+    for row in range(1, 2 * ROWS, 2):
+        grid[row][0] = grid[row][width - 1] = "|"
+    for player, (x, y) in enumerate(pawns):
+        grid[2 * y + 1][4 * x + 2] = str(player + 1)
+    for x, y in horizontal:
+        for column in range(4 * x + 1, 4 * x + 8):
+            grid[2 * y][column] = "#"
+    for x, y in vertical:
+        for row in range(2 * y + 1, 2 * y + 4):
+            grid[row][4 * x] = "#"
+    lines = ["Current player: %i   fences left: %s" % (current_player + 1, " ".join(str(n) for n in fences))]
+    lines += ["".join(row) for row in grid]
+    return "\n".join(lines) + "\n"
+
+# Pawns are drawn as discs, from this mask of one square
+_offsets = np.arange(CELL) - (CELL - 1) / 2
+PAWN_MASK = _offsets[:, None] ** 2 + _offsets[None, :] ** 2 <= (CELL / 2 - 2) ** 2
+
+# PNG frames use a palette: background, grid, fences, then one colour per player
+PALETTE = [BLACK, WHITE, FENCE_COLOR] + COLORS
+GRID = 1
+FENCE = 2
+FIRST_PLAYER = 3
+
+# Image of a frame as a (height, width) uint8 array of palette indices
+def png_image(frame):
+    pawns, horizontal, vertical, current_player, fences = frame
+    image = np.zeros((BAR + SIZE, SIZE), dtype=np.uint8)
+    image[:BAR] = FIRST_PLAYER + current_player
+    grid = image[BAR:]
+    grid[::CELL, :] = GRID
+    grid[:, ::CELL] = GRID
+    for player, (x, y) in enumerate(pawns):
+        grid[y * CELL + 1:(y + 1) * CELL + 1, x * CELL + 1:(x + 1) * CELL + 1][PAWN_MASK] = FIRST_PLAYER + player
+    half = FENCE_WIDTH // 2
+    for x, y in horizontal:
+        grid[max(0, y * CELL - half):y * CELL + half, x * CELL:(x + 2) * CELL + 1] = FENCE
+    for x, y in vertical:
+        grid[y * CELL:(y + 2) * CELL + 1, max(0, x * CELL - half):x * CELL + half] = FENCE
+    return image
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+PNG_PALETTE = png_chunk(b"PLTE", bytes(int(channel) for color in PALETTE for channel in color))
+
+# A palette image encoded as a PNG file
+def png_bytes(image):
+    height, width = image.shape
+    rows = np.zeros((height, width + 1), dtype=np.uint8)
+    rows[:, 1:] = image
+    return (b"\x89PNG\r\n\x1a\n"
+            + png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0))
+            + PNG_PALETTE
+            + png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 1))
+            + png_chunk(b"IEND", b""))
+
+class HeadlessRenderer:
+    def __init__(self, directory, format = "png", max_pending = 256):
+        if format not in FORMATS:
+            raise Exception("Unknown frame format: %s" % format)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.format = format
+        self.frames = 0
+        self.game_closed = False
+        # Bounded, so a game that outruns the disk waits instead of piling up frames
+        self.pending = queue.Queue(max_pending)
+        self.thread = threading.Thread(target=self.write_frames, daemon=True)
+        self.thread.start()
+
+    # Same arguments as QuoridorVisualizer.draw_board; the highlights aren't drawn
+    def draw_board(self, canonical_board, potential_moves = [], current_space = [], potential_fences = [], current_fence = []):
+        self.pending.put((self.frames, snapshot(canonical_board)))
+        self.frames += 1
+
+    def write_frames(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            index, frame = item
+            path = os.path.join(self.directory, "frame_%05i.%s" % (index, FORMATS[self.format]))
+            if self.format == "ascii":
+                with open(path, "w") as file:
+                    file.write(ascii_frame(frame))
+            else:
+                with open(path, "wb") as file:
+                    file.write(png_bytes(png_image(frame)))
+
+    # Wait for every frame to be written
+    def close(self):
+        if self.thread.is_alive():
+            self.pending.put(None)
+            self.thread.join()
+        self.game_closed = True
@@ -1,5 +1,5 @@
 from QuoridorMove import QuoridorMoveType
-import pygame
+from QuoridorVisualizer import load_pygame
 from enum import Enum
 
 class CurrentSelection(Enum):
@@ -16,10 +16,23 @@ class CurrentSelection(Enum):
             return CurrentSelection.VERTICAL_FENCE
 
 class HumanPlayer():
-    def __init__(self, game):
+    """
+    Lets a person pick moves in the visualizer's window with the keyboard.
+
+    While waiting for a key the player sleeps in pygame.event.wait instead
+    of polling, so it uses no CPU and other threads can run, and the board
+    is redrawn at most max_fps times a second.
+    """
+
+    # Deciding leaves the CPU free, so Arena lets opponents ponder meanwhile
+    waits_for_input = True
+
+    def __init__(self, game, max_fps = 30):
         self.game = game
+        self.max_fps = max_fps
 
     def play(self, board, valid_moves):
+        pygame = load_pygame()
         self.moves = []
         self.fences = [[], []] # Horizontal, then vertical
 
@@ -41,43 +54,42 @@ class HumanPlayer():
 
         self.current_selection = CurrentSelection.MOVE
 
+        visualizer = self.game.visualizer
+        # Keys pressed before this turn, during an opponent's, are not meant for it
+        if visualizer.game_closed or pygame.event.get(pygame.QUIT):
+            visualizer.close()
+            raise Exception("The game window was closed")
+        pygame.event.clear()
+        visualizer.reading_input = True
+        try:
+            return self.read_move(pygame, visualizer, board)
+        finally:
+            visualizer.reading_input = False
+
+    # Show the choices and change them with the arrow keys and space until enter picks one
+    def read_move(self, pygame, visualizer, board):
+        clock = pygame.time.Clock()
         redraw = True
         while True:
             if redraw:
                 if self.current_selection == CurrentSelection.MOVE:
-                    self.game.visualizer.draw_board(board, self.moves, [self.moves[self.current_move_index]], [], [])
+                    visualizer.draw_board(board, self.moves, [self.moves[self.current_move_index]], [], [])
                 elif self.current_selection == CurrentSelection.HORIZONTAL_FENCE:
-                    self.game.visualizer.draw_board(board, [], [], self.fences[0], [self.fences[0][self.current_fence_index[0]]])
+                    visualizer.draw_board(board, [], [], self.fences[0], [self.fences[0][self.current_fence_index[0]]])
                 elif self.current_selection == CurrentSelection.VERTICAL_FENCE:
-                    self.game.visualizer.draw_board(board, [], [], self.fences[1], [self.fences[1][self.current_fence_index[1]]])
-
+                    visualizer.draw_board(board, [], [], self.fences[1], [self.fences[1][self.current_fence_index[1]]])
                 redraw = False
+                # Keys held down can't redraw more than max_fps times a second
+                clock.tick(self.max_fps)
+
+            if visualizer.game_closed:
+                raise Exception("The game window was closed")
 
-            #keystate = pygame.key.get_pressed()
-
-            #if keystate[pygame.K_RETURN]:
-            #    if self.select_fences:
-            #        return self.fences[self.current_fence_index]
-            #    else:
-            #        return self.moves[self.current_move_index]
-
-            #if keystate[pygame.K_SPACE]:
-            #    self.select_fences = not self.select_fences
-            #    redraw = True
-            #if keystate[pygame.K_RIGHT]:
-            #    self.adjust(self.get_next)
-            #    redraw = True
-            #if keystate[pygame.K_LEFT]:
-            #    self.adjust(self.get_previous)
-            #    redraw = True
-            #if keystate[pygame.K_UP]:
-            #    self.adjust(self.get_previous_row)
-            #    redraw = True
-            #if keystate[pygame.K_DOWN]:
-            #    self.adjust(self.get_next_row)
-            #    redraw = True
-
-            for event in pygame.event.get():
+            # Sleep until the next event; other threads, like a pondering opponent, run meanwhile
+            events = [pygame.event.wait()] + pygame.event.get()
+            for event in events:
+                if event.type == pygame.QUIT:
+                    visualizer.close()
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_RETURN:
                         if self.current_selection == CurrentSelection.MOVE:
@@ -87,7 +99,6 @@ class HumanPlayer():
                         elif self.current_selection == CurrentSelection.VERTICAL_FENCE:
                             return self.fences[1][self.current_fence_index[1]]
 
-
                     if event.key == pygame.K_SPACE:
                         if self.fences[0] or self.fences[1]:
                             self.current_selection = CurrentSelection.increment(self.current_selection)
@@ -0,0 +1,203 @@
+import cProfile
+import csv
+import io
+import json
+import math
+import pstats
+import tracemalloc
+
+# The phases of a turn in Arena.playGame, in order
+MOVE_GENERATION = "move_generation"
+DECISION = "decision"
+TRANSITION = "transition"
+WIN_CHECK = "win_check"
+PHASES = [MOVE_GENERATION, DECISION, TRANSITION, WIN_CHECK]
+
+# Histogram bucket i counts times up to 2 ** i microseconds
+N_BUCKETS = 28
+
+class Instrument():
+    """
+    Hooks Arena calls while a game is played. Subclass and override the ones you need.
+
+    before and after are called around every phase of every turn, after also
+    gets the time the phase took. With Arena.playGames each game gets a fresh
+    instrument from spawn, and the parent's instrument collects them with
+    merge, so instruments work the same whether games run in this process or
+    in worker processes.
+    """
+
+    # seed is the seed the game was started with, if any, and names the players' names by seat
+    def game_started(self, board, seed, names):
+        pass
+
+    def before(self, phase, player, board):
+        pass
+
+    def after(self, phase, player, board, elapsed):
+        pass
+
+    def move_played(self, player, move):
+        pass
+
+    # agent is the object whose method made the decision, if there is one
+    def turn_finished(self, player, agent):
+        pass
+
+    def game_finished(self, winner):
+        pass
+
+    # A new empty instrument with the same settings, for one game of a tournament
+    def spawn(self):
+        return type(self)()
+
+    # Add the results of an instrument made by spawn; seats[seat] is the player in each seat
+    def merge(self, other, seats, game_index):
+        pass
+
+class TurnProfiler(Instrument):
+    """
+    Records where each turn's time goes.
+
+    For every player and phase it keeps a latency histogram with power of two
+    buckets, plus the count, total and maximum. For every turn it keeps one
+    row with the time of each phase and the node count the agent reported in
+    last_search_stats, if it has one.
+
+    Decisions slower than slow_turn seconds are kept with a cProfile summary
+    (profile=True) and the biggest memory allocations (trace_memory=True).
+    Both tools slow every decision down while they are on, not only the slow
+    ones, so leave them off when timing.
+    """
+
+    def __init__(self, slow_turn = None, profile = False, trace_memory = False, top = 15):
+        self.slow_turn = slow_turn
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.top = top
+        # (player, phase) -> [count, total, max, histogram]
+        self.latencies = {}
+        self.turns = []
+        self.slow_turns = []
+        self.games = 0
+        self.game_index = 0
+        self.turn = 0
+        self.current = None
+        self.profiler = None
+
+    def spawn(self):
+        return TurnProfiler(self.slow_turn, self.profile, self.trace_memory, self.top)
+
+    def game_started(self, board, seed, names):
+        self.turn = 0
+
+    def before(self, phase, player, board):
+        if phase == MOVE_GENERATION:
+            self.turn += 1
+            self.current = {"game": self.game_index, "turn": self.turn, "player": player, "nodes": None}
+        elif phase == DECISION:
+            if self.profile:
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+            if self.trace_memory:
+                tracemalloc.start()
+
+    def after(self, phase, player, board, elapsed):
+        if phase == DECISION:
+            self.finish_capture(player, elapsed)
+        self.current[phase] = elapsed
+        self.record(player, phase, elapsed)
+
+    def turn_finished(self, player, agent):
+        stats = getattr(agent, "last_search_stats", None)
+        if stats:
+            self.current["nodes"] = stats.get("nodes")
+        self.turns.append(self.current)
+
+    def game_finished(self, winner):
+        self.games += 1
+        self.game_index += 1
+
+    # Stop the profilers for a decision and keep what they saw if it was slow
+    def finish_capture(self, player, elapsed):
+        slow = self.slow_turn is not None and elapsed >= self.slow_turn
+        profiler = self.profiler
+        self.profiler = None
+        if profiler is not None:
+            profiler.disable()
+        memory = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            if slow:
+                snapshot = tracemalloc.take_snapshot()
+                memory = [str(stat) for stat in snapshot.statistics("lineno")[:self.top]]
+            tracemalloc.stop()
+        if not slow:
+            return
+        profile_text = None
+        if profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(self.top)
+            profile_text = stream.getvalue()
+        self.slow_turns.append({"game": self.current["game"], "turn": self.current["turn"], "player": player,
+                                "decision": elapsed, "profile": profile_text, "memory": memory})
+
+    def record(self, player, phase, elapsed):
+        entry = self.latencies.get((player, phase))
+        if entry is None:
+            entry = [0, 0.0, 0.0, [0] * N_BUCKETS]
+            self.latencies[(player, phase)] = entry
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+        entry[3][bucket(elapsed)] += 1
+
+    def merge(self, other, seats, game_index):
+        for (seat, phase), (count, total, longest, histogram) in other.latencies.items():
+            entry = self.latencies.get((seats[seat], phase))
+            if entry is None:
+                entry = [0, 0.0, 0.0, [0] * N_BUCKETS]
+                self.latencies[(seats[seat], phase)] = entry
+            entry[0] += count
+            entry[1] += total
+            entry[2] = max(entry[2], longest)
+            entry[3] = [mine + theirs for mine, theirs in zip(entry[3], histogram)]
+        for row in other.turns:
+            self.turns.append(dict(row, game=game_index, player=seats[row["player"]]))
+        for turn in other.slow_turns:
+            self.slow_turns.append(dict(turn, game=game_index, player=seats[turn["player"]]))
+        self.games += other.games
+
+    # Count, total, mean, max and histogram of every player and phase
+    def summary(self):
+        players = {}
+        for (player, phase), (count, total, longest, histogram) in sorted(self.latencies.items()):
+            players.setdefault(player, {})[phase] = {
+                "count": count,
+                "total": total,
+                "mean": total / count if count else 0.0,
+                "max": longest,
+                "histogram": {"<=%ius" % (1 << i): n for i, n in enumerate(histogram) if n},
+            }
+        nodes = {}
+        for row in self.turns:
+            if row["nodes"] is not None:
+                nodes[row["player"]] = nodes.get(row["player"], 0) + row["nodes"]
+        return {"games": self.games, "turns": len(self.turns), "players": players, "nodes": nodes, "slow_turns": self.slow_turns}
+
+    def to_json(self, path):
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    # One row per turn with the seconds spent in each phase
+    def to_csv(self, path):
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=["game", "turn", "player"] + PHASES + ["nodes"], restval="")
+            writer.writeheader()
+            writer.writerows(self.turns)
+
+# Histogram bucket for a time in seconds
+def bucket(elapsed):
+    microseconds = elapsed * 1e6
+    if microseconds <= 1:
+        return 0
+    return min(N_BUCKETS - 1, math.ceil(math.log2(microseconds)))
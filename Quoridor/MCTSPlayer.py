@@ -0,0 +1,343 @@
+import logging
+import math
+import random
+import threading
+import time
+from copy import deepcopy
+
+from QuoridorMove import QuoridorMoveType
+
+log = logging.getLogger(__name__)
+
+class MCTSNode():
+    """
+    One position in the search tree.
+
+    value_sum holds one total per player, so the same tree works for two and
+    four players: each player picks children by their own average value.
+    """
+
+    def __init__(self, board_hash, player, prior = 1.0):
+        self.hash = board_hash
+        # Player to move in this position
+        self.player = player
+        self.prior = prior
+        self.children = {}
+        self.visits = 0
+        self.value_sum = None
+        self.virtual_loss = 0
+        self.expanded = False
+        self.has_priors = False
+        self.terminal_values = None
+
+    # Average value of this node for a player, counting pending virtual losses as losses
+    def value(self, player):
+        visits = self.visits + self.virtual_loss
+        if visits == 0:
+            return 0.0
+        total = self.value_sum[player] if self.value_sum is not None else 0.0
+        return (total - self.virtual_loss) / visits
+
+class RolloutEvaluator():
+    """
+    Default leaf evaluator: a short random playout of pawn moves, then a score
+    from the shortest path lengths of every player.
+
+    Evaluators take a list of boards, which they may modify, and return a list
+    of (priors, values) pairs, one per board. priors maps moves to
+    probabilities, or is None to search with plain UCT; values has one entry
+    per player between -1 and 1. A neural network can be dropped in with the
+    same interface and scored one batch at a time.
+
+    Without a seed, rollouts draw from the random module, which Arena seeds
+    for every game, so seeded games play out the same every time.
+    """
+
+    def __init__(self, rollout_steps = 8, forward_bias = 0.75, seed = None):
+        self.rollout_steps = rollout_steps
+        self.forward_bias = forward_bias
+        self.rng = random.Random(seed) if seed is not None else random
+
+    def __call__(self, boards):
+        return [(None, self.rollout(board)) for board in boards]
+
+    def rollout(self, board):
+        for step in range(self.rollout_steps):
+            winner = board.get_win_state()
+            if winner != -1:
+                return [1.0 if player == winner else -1.0 for player in range(len(board.pawns))]
+            player = board.current_player
+            coords = board.get_legal_move_positions_for_player(player)
+            if not coords:
+                break
+            forward = [coord for coord in coords if board.get_target(player)(coord) or self.moves_forward(board, player, coord)]
+            if forward and self.rng.random() < self.forward_bias:
+                coords = forward
+            board.move_pawn(player, coords[self.rng.randrange(len(coords))])
+            board.next_player()
+        return distance_values(board)
+
+    # Check if a pawn move heads toward the player's goal
+    def moves_forward(self, board, player, coord):
+        pawn = board.pawns[player]
+        if player == 0:
+            return coord.y > pawn.y
+        if player == 1 and len(board.pawns) == 4:
+            return coord.x > pawn.x
+        if player == 3:
+            return coord.x < pawn.x
+        return coord.y < pawn.y
+
+# Score every player from the difference between their distance to goal and the best opponent's
+def distance_values(board):
+    winner = board.get_win_state()
+    n_players = len(board.pawns)
+    if winner != -1:
+        return [1.0 if player == winner else -1.0 for player in range(n_players)]
+    fields = board.distance_field.get(board)
+    distances = [int(fields[player, pawn.y, pawn.x]) for player, pawn in enumerate(board.pawns)]
+    values = []
+    for player in range(n_players):
+        opponent = min(distance for other, distance in enumerate(distances) if other != player)
+        values.append(math.tanh((opponent - distances[player]) / 4.0))
+    return values
+
+class MCTSPlayer():
+    """
+    Monte Carlo Tree Search player.
+
+    Children are picked with UCT, or with PUCT when the evaluator returns move
+    priors. Each iteration walks down batch_size paths, adding a virtual loss
+    on the way so the paths spread out, and hands all the leaves to the
+    evaluator in one call. The tree is kept between moves and the subtree for
+    the position actually reached is reused, found by Zobrist hash.
+
+    Search stops after n_simulations leaves or time_limit seconds, whichever
+    comes first.
+
+    ponder grows the tree from a position where an opponent is to move on a
+    background thread, with the same budget as a move, until stop_pondering.
+    The next play finds the opponent's actual reply in the tree and starts
+    from its subtree.
+    """
+
+    def __init__(self, game, n_simulations = 800, time_limit = None, batch_size = 16, c_uct = 1.4, c_puct = 1.5, evaluator = None, relevant_fences_only = True):
+        self.game = game
+        self.n_simulations = n_simulations
+        self.time_limit = time_limit
+        self.batch_size = batch_size
+        self.c_uct = c_uct
+        self.c_puct = c_puct
+        self.evaluator = evaluator if evaluator is not None else RolloutEvaluator()
+        # Only expand fences that cut an opponent's current shortest path
+        self.relevant_fences_only = relevant_fences_only
+        self.root = None
+        self.last_search_stats = {}
+        self.ponder_thread = None
+        self.stop_requested = False
+        self.pondered = 0
+
+    def play(self, board, valid_moves):
+        self.stop_pondering()
+        pondered = self.pondered
+        self.pondered = 0
+        if len(valid_moves) == 1:
+            return valid_moves[0]
+
+        start_time = time.perf_counter()
+        reused = self.find_root(board)
+        root = self.root
+        self.prepare_root(board, valid_moves)
+
+        simulations = 0
+        batches = 0
+        while simulations < self.n_simulations:
+            if self.time_limit is not None and time.perf_counter() - start_time > self.time_limit:
+                break
+            simulations += self.run_batch(board, min(self.batch_size, self.n_simulations - simulations))
+            batches += 1
+
+        best_move, best_child = max(root.children.items(), key=lambda item: item[1].visits)
+        elapsed = time.perf_counter() - start_time
+        self.last_search_stats = {
+            "simulations": simulations,
+            "batches": batches,
+            "reused_visits": reused,
+            "pondered": pondered,
+            "time": elapsed,
+            "nodes": simulations,
+            "nps": simulations / elapsed if elapsed > 0 else 0.0,
+            "value": best_child.value(root.player),
+        }
+        log.info("%i simulations in %i batches, %.3fs (%.0f/s), reused %i visits", simulations, batches, elapsed, self.last_search_stats["nps"], reused)
+
+        for move in valid_moves:
+            if move == best_move:
+                return move
+        return best_move
+
+    # Start growing the tree from board, where an opponent is to move, on a background thread
+    def ponder(self, board, player):
+        self.stop_pondering()
+        self.stop_requested = False
+        self.ponder_thread = threading.Thread(target=self.ponder_search, args=(board,), daemon=True)
+        self.ponder_thread.start()
+
+    def ponder_search(self, board):
+        start_time = time.perf_counter()
+        self.find_root(board)
+        self.prepare_root(board, board.get_valid_moves())
+        simulations = 0
+        while simulations < self.n_simulations and not self.stop_requested:
+            if self.time_limit is not None and time.perf_counter() - start_time > self.time_limit:
+                break
+            finished = self.run_batch(board, min(self.batch_size, self.n_simulations - simulations))
+            simulations += finished
+            self.pondered += finished
+
+    # Stop pondering and wait for the batch in progress to finish
+    def stop_pondering(self):
+        if self.ponder_thread is None:
+            return
+        self.stop_requested = True
+        self.ponder_thread.join()
+        self.ponder_thread = None
+
+    # Expand a new root and back up its first evaluation
+    def prepare_root(self, board, valid_moves):
+        root = self.root
+        if not root.expanded:
+            self.expand(root, board, self.expansion_moves(board, valid_moves))
+            priors, values = self.evaluator([deepcopy(board)])[0]
+            self.set_priors(root, priors)
+            self.backup([root], values)
+
+    # Reuse the subtree for the current position if the last search reached it
+    # Returns the number of visits kept
+    def find_root(self, board):
+        if self.root is not None:
+            frontier = [self.root]
+            for depth in range(len(board.pawns) + 1):
+                for node in frontier:
+                    if node.hash == board.hash and node.player == board.current_player:
+                        self.root = node
+                        return node.visits
+                frontier = [child for node in frontier for child in node.children.values()]
+        self.root = MCTSNode(board.hash, board.current_player)
+        return 0
+
+    # Select up to count leaves, evaluate them in one call and back up the results
+    # Returns the number of simulations finished
+    def run_batch(self, board, count):
+        leaves = []
+        simulations = 0
+        for i in range(count):
+            path = self.select(board)
+            leaf = path[-1]
+            if leaf.terminal_values is not None:
+                self.unwind(board, path)
+                self.remove_virtual_loss(path)
+                self.backup(path, leaf.terminal_values)
+                simulations += 1
+                continue
+            if leaf.virtual_loss > 1:
+                # Another path in this batch already ended here; evaluate what we have
+                self.unwind(board, path)
+                self.remove_virtual_loss(path)
+                break
+            self.expand(leaf, board, self.expansion_moves(board))
+            leaves.append((path, deepcopy(board)))
+            self.unwind(board, path)
+
+        if leaves:
+            results = self.evaluator([leaf_board for path, leaf_board in leaves])
+            for (path, leaf_board), (priors, values) in zip(leaves, results):
+                self.set_priors(path[-1], priors)
+                self.remove_virtual_loss(path)
+                self.backup(path, values)
+                simulations += 1
+        return simulations
+
+    # Walk down from the root, applying moves to board, until reaching a leaf
+    # Every node on the way gets a virtual loss
+    def select(self, board):
+        node = self.root
+        node.virtual_loss += 1
+        path = [node]
+        while node.children:
+            move, node = self.best_child(node)
+            board.apply(move)
+            node.virtual_loss += 1
+            path.append(node)
+            if not node.expanded:
+                winner = board.get_win_state()
+                if winner != -1:
+                    node.terminal_values = [1.0 if player == winner else -1.0 for player in range(len(board.pawns))]
+                    node.expanded = True
+        return path
+
+    # Take back the moves applied while walking down path
+    def unwind(self, board, path):
+        for i in range(len(path) - 1):
+            board.undo()
+
+    # Child with the highest UCT / PUCT score for the player to move
+    def best_child(self, node):
+        player = node.player
+        parent_visits = node.visits + node.virtual_loss
+        best_score = -math.inf
+        best = None
+        for move, child in node.children.items():
+            visits = child.visits + child.virtual_loss
+            if node.has_priors:
+                score = child.value(player) + self.c_puct * child.prior * math.sqrt(parent_visits) / (1 + visits)
+            elif visits == 0:
+                score = math.inf
+            else:
+                score = child.value(player) + self.c_uct * math.sqrt(math.log(parent_visits) / visits)
+            if score > best_score:
+                best_score = score
+                best = (move, child)
+        return best
+
+    # Create the children of a node, one per move
+    def expand(self, node, board, moves):
+        if node.expanded:
+            return
+        for move in moves:
+            board.apply(move)
+            node.children[move] = MCTSNode(board.hash, board.current_player)
+            board.undo()
+        node.expanded = True
+
+    # Switch a node to PUCT with the priors the evaluator gave its moves
+    def set_priors(self, node, priors):
+        if priors is None:
+            return
+        node.has_priors = True
+        for move, child in node.children.items():
+            child.prior = priors.get(move, 0.0)
+
+    # Moves worth adding to the tree: every pawn move, and fences that get in an opponent's way
+    def expansion_moves(self, board, valid_moves = None):
+        if valid_moves is None:
+            # Only the fences that are kept need their path checked
+            return list(board.generate_moves(relevant_only=self.relevant_fences_only))
+        if not self.relevant_fences_only:
+            return valid_moves
+        cuts = board.fence_cuts(board.current_player)
+        return [move for move in valid_moves if move.type == QuoridorMoveType.MOVE or (move.is_horizontal, move.coord.x, move.coord.y) in cuts]
+
+    def remove_virtual_loss(self, path):
+        for node in path:
+            node.virtual_loss -= 1
+
+    # Add the leaf values to every node on the path
+    def backup(self, path, values):
+        for node in path:
+            node.visits += 1
+            if node.value_sum is None:
+                node.value_sum = list(values)
+            else:
+                for player, value in enumerate(values):
+                    node.value_sum[player] += value
@@ -0,0 +1,61 @@
+class MoveList():
+    """
+    A list of moves filled in from a generator as it is read.
+
+    Iterating, indexing a move already generated, or testing whether a move
+    is in the list only generate as far as needed, so a player that takes the
+    first move it likes never pays for the rest. len, negative indexes and
+    repr generate everything.
+
+    The board behind the generator must not change until the list has been
+    read, except for changes that are put back, as with apply and undo.
+    """
+
+    def __init__(self, moves):
+        self.generator = iter(moves)
+        self.moves = []
+
+    # Generate one more move; returns False if there are none left
+    def generate_one(self):
+        if self.generator is None:
+            return False
+        for move in self.generator:
+            self.moves.append(move)
+            return True
+        self.generator = None
+        return False
+
+    # Generate every remaining move and return them all as a list
+    def finish(self):
+        if self.generator is not None:
+            self.moves.extend(self.generator)
+            self.generator = None
+        return self.moves
+
+    def __iter__(self):
+        index = 0
+        while index < len(self.moves) or self.generate_one():
+            yield self.moves[index]
+            index += 1
+
+    def __contains__(self, move):
+        for other in self:
+            if other == move:
+                return True
+        return False
+
+    def __getitem__(self, index):
+        if isinstance(index, int) and index >= 0:
+            while index >= len(self.moves) and self.generate_one():
+                pass
+            return self.moves[index]
+        return self.finish()[index]
+
+    def __len__(self):
+        return len(self.finish())
+
+    def __bool__(self):
+        return len(self.moves) > 0 or self.generate_one()
+
+    def __repr__(self):
+        return repr(self.finish())
@@ -0,0 +1,185 @@
+"""
+Opening book built from recorded games.
+
+The book keeps, for every position seen in the first max_plies moves of the
+games it was built from, each move that was played there, how many games it
+was played in and how many of those the player who played it went on to win.
+Positions are keyed by canonical hash (see Symmetry), so looking one up is a
+dict access, and moves are kept as played on the canonical image, so games
+that are mirror images of each other count towards the same entries.
+
+On disk a book is the 4 byte magic b"QROB", a version byte, the number of
+players, max_plies and the number of entries, followed by the entries sorted
+by position:
+
+    uint64   canonical position hash
+    uint8    move on the canonical image, numbered as in GameRecord
+    uint32   games the move was played in
+    uint32   games the player who played it won
+
+Build a book from game records with
+
+    python OpeningBook.py games.qrgr --output book.qrob
+"""
+
+import argparse
+import struct
+
+import numpy as np
+
+from GameRecord import GameRecordReader, decode_move, encode_move
+from QuoridorBoard import QuoridorBoard
+from Symmetry import canonical, canonical_hash, canonical_symmetries
+
+MAGIC = b"QROB"
+VERSION = 2
+HEADER = struct.Struct("<4sBBHI")
+ENTRY = np.dtype([("hash", "<u8"), ("move", "u1"), ("games", "<u4"), ("wins", "<u4")])
+
+class OpeningBook():
+    def __init__(self, n_players = 2, max_plies = 12):
+        self.n_players = n_players
+        self.max_plies = max_plies
+        # hash -> {move code: [games, wins]}
+        self.positions = {}
+
+    # Count the opening moves of a GameRecord.Game
+    def add_game(self, game):
+        if game.n_players != self.n_players:
+            return
+        board = QuoridorBoard(self.n_players)
+        # The moves were checked when the game was played
+        board.check_possible = False
+        for code in game.moves[:self.max_plies]:
+            player = board.current_player
+            move = decode_move(code, player)
+            # In a position that is its own mirror image, a move and its image count as one
+            code = min(encode_move(symmetry.move(move)) for symmetry in canonical_symmetries(board))
+            stats = self.positions.setdefault(canonical_hash(board), {}).setdefault(code, [0, 0])
+            stats[0] += 1
+            if game.winner == player:
+                stats[1] += 1
+            board.apply(move)
+
+    # Count every game in a record file
+    def add_records(self, path):
+        with GameRecordReader(path) as reader:
+            for game in reader:
+                self.add_game(game)
+
+    # (move, games, wins) of every book move in the position, most played first
+    def moves(self, board):
+        if board.ply >= self.max_plies:
+            return []
+        key, symmetry = canonical(board)
+        entries = self.positions.get(key)
+        if entries is None:
+            return []
+        seat = symmetry.seats[board.current_player]
+        moves = [(symmetry.inverse.move(decode_move(code, seat)), games, wins) for code, (games, wins) in entries.items()]
+        moves.sort(key=lambda entry: -entry[1])
+        return moves
+
+    # The book move with the best win rate among those played in at least min_games games, or None
+    # Win rates are smoothed as (wins + 1) / (games + 2), so a move won once in one game isn't a sure thing
+    def choose(self, board, min_games = 1):
+        if board.ply >= self.max_plies:
+            return None
+        key, symmetry = canonical(board)
+        entries = self.positions.get(key)
+        if entries is None:
+            return None
+        best_code = None
+        best_rate = -1.0
+        for code, (games, wins) in entries.items():
+            if games >= min_games:
+                rate = (wins + 1) / (games + 2)
+                if rate > best_rate:
+                    best_code = code
+                    best_rate = rate
+        if best_code is None:
+            return None
+        return symmetry.inverse.move(decode_move(best_code, symmetry.seats[board.current_player]))
+
+    def __len__(self):
+        return len(self.positions)
+
+    # Write the book, leaving out moves played in fewer than min_games games
+    def save(self, path, min_games = 1):
+        entries = [(key, code, games, wins)
+                   for key, moves in self.positions.items()
+                   for code, (games, wins) in moves.items() if games >= min_games]
+        entries.sort()
+        table = np.array(entries, dtype=ENTRY)
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, self.n_players, self.max_plies, len(table)))
+            file.write(table.tobytes())
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, version, n_players, max_plies, n_entries = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise Exception("Not a Quoridor opening book file")
+        if version != VERSION:
+            raise Exception("Unsupported opening book version: %i" % version)
+        book = OpeningBook(n_players, max_plies)
+        table = np.frombuffer(data, dtype=ENTRY, count=n_entries, offset=HEADER.size)
+        positions = book.positions
+        for key, code, games, wins in zip(table["hash"].tolist(), table["move"].tolist(), table["games"].tolist(), table["wins"].tolist()):
+            moves = positions.get(key)
+            if moves is None:
+                moves = positions[key] = {}
+            moves[code] = [games, wins]
+        return book
+
+class BookPlayer():
+    """
+    Plays book moves while the opening book knows the position, and lets
+    another player's play method choose the rest.
+    """
+
+    def __init__(self, game, book, fallback, min_games = 1):
+        self.game = game
+        self.book = book
+        self.fallback = fallback
+        self.min_games = min_games
+        self.last_search_stats = {}
+
+    def play(self, board, valid_moves):
+        move = self.book.choose(board, self.min_games)
+        if move is not None and move in valid_moves:
+            self.last_search_stats = {"book": True, "nodes": 0}
+            return move
+        move = self.fallback(board, valid_moves)
+        self.last_search_stats = getattr(self.agent(), "last_search_stats", {})
+        return move
+
+    # The object whose method the fallback is, if it has one
+    def agent(self):
+        return getattr(self.fallback, "__self__", None)
+
+    # Pondering is passed on to the fallback player, if it ponders
+    def ponder(self, board, player):
+        if hasattr(self.agent(), "ponder"):
+            self.agent().ponder(board, player)
+
+    def stop_pondering(self):
+        if hasattr(self.agent(), "stop_pondering"):
+            self.agent().stop_pondering()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an opening book from game records")
+    parser.add_argument("records", nargs="+", help="game record files written by GameRecorder")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--players", type=int, choices=[2, 4], default=2)
+    parser.add_argument("--plies", type=int, default=12, help="moves from the start of each game to keep")
+    parser.add_argument("--min-games", type=int, default=2, help="leave out moves played in fewer games")
+    args = parser.parse_args()
+
+    book = OpeningBook(args.players, args.plies)
+    for path in args.records:
+        book.add_records(path)
+    book.save(args.output, args.min_games)
+    print("%i positions, written to %s" % (len(book), args.output))
@@ -0,0 +1,78 @@
+"""
+Fixed numbering of every Quoridor move, for agents and learners that work on arrays.
+
+Actions are numbered:
+    0 - 11:    pawn moves, as an offset from the pawn (see PAWN_OFFSETS)
+    12 - 75:   horizontal fences, by slot
+    76 - 139:  vertical fences, by slot
+A fence slot is the corner point in the middle of the fence, numbered
+(cy - 1) * 8 + (cx - 1), as in QuoridorBoard.fence_slot. A horizontal fence at (x, y)
+is in slot (y - 1) * 8 + x and a vertical fence at (x, y) in slot y * 8 + x - 1.
+
+Pawn moves are relative to the pawn of the player making them, so converting
+between moves and actions needs the board the move is played on.
+"""
+
+import numpy as np
+
+from Coordinate import Coordinate
+from QuoridorBoard import Fence
+from QuoridorMove import QuoridorMove, QuoridorMoveType
+
+# Steps, straight jumps and diagonal jumps
+PAWN_OFFSETS = [(-1, 0), (0, -1), (1, 0), (0, 1),
+                (-2, 0), (0, -2), (2, 0), (0, 2),
+                (-1, -1), (1, -1), (-1, 1), (1, 1)]
+N_PAWN_ACTIONS = len(PAWN_OFFSETS)
+N_SLOTS = 64
+HORIZONTAL_BASE = N_PAWN_ACTIONS
+VERTICAL_BASE = N_PAWN_ACTIONS + N_SLOTS
+ACTION_SIZE = N_PAWN_ACTIONS + 2 * N_SLOTS
+
+# Action number of each pawn offset
+OFFSET_ACTIONS = {offset: action for action, offset in enumerate(PAWN_OFFSETS)}
+
+# ACTION_FENCES[action - HORIZONTAL_BASE] is (is_horizontal, x, y) of a fence action
+ACTION_FENCES = [(True, slot % 8, slot // 8 + 1) for slot in range(N_SLOTS)] + \
+                [(False, slot % 8 + 1, slot // 8) for slot in range(N_SLOTS)]
+
+def fence_action(is_horizontal, x, y):
+    if is_horizontal:
+        return HORIZONTAL_BASE + (y - 1) * 8 + x
+    return VERTICAL_BASE + y * 8 + x - 1
+
+def pawn_action(pawn, coord):
+    return OFFSET_ACTIONS[(coord.x - pawn.x, coord.y - pawn.y)]
+
+# Action number of a move on board
+def move_to_action(board, move):
+    if move.type == QuoridorMoveType.MOVE:
+        return pawn_action(board.pawns[move.player], move.coord)
+    return fence_action(move.is_horizontal, move.coord.x, move.coord.y)
+
+# Move for an action number, played on board by player (default the player to move)
+def action_to_move(board, action, player = None):
+    if player is None:
+        player = board.current_player
+    if action < N_PAWN_ACTIONS:
+        pawn = board.pawns[player]
+        dx, dy = PAWN_OFFSETS[action]
+        return QuoridorMove.move_pawn(Coordinate(pawn.x + dx, pawn.y + dy), player)
+    if action >= ACTION_SIZE:
+        raise Exception("Illegal action: %i" % action)
+    is_horizontal, x, y = ACTION_FENCES[action - HORIZONTAL_BASE]
+    return QuoridorMove.add_fence(Fence(Coordinate(x, y), is_horizontal), player)
+
+# Fill out (or a new array) with 1 for every legal action of the player to move
+def valid_mask(board, out = None):
+    if out is None:
+        out = np.zeros(ACTION_SIZE, dtype=np.uint8)
+    else:
+        out[:] = 0
+    player = board.current_player
+    pawn = board.pawns[player]
+    for coord in board.get_legal_move_positions_for_player(player):
+        out[pawn_action(pawn, coord)] = 1
+    for move in board.get_legal_fences(player):
+        out[fence_action(move.is_horizontal, move.coord.x, move.coord.y)] = 1
+    return out
@@ -0,0 +1,416 @@
+"""
+Many Quoridor games stepped together as NumPy arrays.
+
+Actions use the fixed numbering of QuoridorActions: 12 pawn moves relative
+to the pawn, then 64 horizontal and 64 vertical fence slots.
+"""
+
+import numpy as np
+
+from QuoridorActions import N_PAWN_ACTIONS, N_SLOTS, HORIZONTAL_BASE, VERTICAL_BASE, OFFSET_ACTIONS
+import QuoridorActions
+from DistanceField import goal_masks
+
+PAWN_OFFSETS = np.array(QuoridorActions.PAWN_OFFSETS, dtype=np.int8)
+
+# Directions in the order QuoridorBoard tries them
+WEST, NORTH, EAST, SOUTH = range(4)
+STEPS = [(-1, 0), (0, -1), (1, 0), (0, 1)]
+
+def start_positions(n_players):
+    if n_players == 2:
+        return [(4, 0), (4, 8)], 10
+    elif n_players == 4:
+        return [(4, 0), (0, 4), (4, 8), (8, 4)], 5
+    raise Exception("Illegal number of players")
+
+# Bit x of a packed row is column x
+ROW_BITS = (1 << np.arange(9)).astype(np.uint16)
+FULL_ROW = 0x1FF
+
+# Pack (..., 9, 9) boolean cells indexed [y, x] into (..., 9) rows of bits
+def pack_rows(cells):
+    return (cells * ROW_BITS).sum(axis=-1, dtype=np.uint16)
+
+# One step of spreading reached squares over open edges
+# All arguments are (M, 9) packed rows; open_south[y] has bit x set if (x, y) to (x, y + 1)
+# is open, open_east[y] has bit x set if (x, y) to (x + 1, y) is open
+def spread(reach, open_south, open_east):
+    new = reach | ((reach & open_east) << 1) | ((reach >> 1) & open_east)
+    new[:, 1:] |= reach[:, :-1] & open_south[:, :-1]
+    new[:, :-1] |= reach[:, 1:] & open_south[:, :-1]
+    return new
+
+# Check, for each of M games, if the edge from (x, y) in direction is on the board and open
+# x and y are (M,) arrays, open_south and open_east (M, 9) packed rows as in spread
+def row_edge_open(open_south, open_east, x, y, direction):
+    dx, dy = STEPS[direction]
+    nx = x + dx
+    ny = y + dy
+    on_board = (x >= 0) & (x < 9) & (y >= 0) & (y < 9) & (nx >= 0) & (nx < 9) & (ny >= 0) & (ny < 9)
+    cx = np.clip(np.minimum(x, nx), 0, 8).astype(np.uint16)
+    cy = np.clip(np.minimum(y, ny), 0, 8)
+    edges = open_south if dx == 0 else open_east
+    return on_board & (((edges[np.arange(len(x)), cy] >> cx) & 1) != 0)
+
+# Check, for each of M games, if (x, y) is on the board and its bit is set in the packed rows
+def row_bit(rows, x, y):
+    on_board = (x >= 0) & (x < 9) & (y >= 0) & (y < 9)
+    bits = rows[np.arange(len(x)), np.clip(y, 0, 8)] >> np.clip(x, 0, 8).astype(np.uint16)
+    return on_board & ((bits & 1) != 0)
+
+# Spread reachable squares over open edges until nothing changes, or until
+# every game has reached a goal square if goals is given
+# With free, steps only go to free squares, and a square in reach that is the approach of
+# one of jumps, (approach x, approach y, target rows), also reaches the target squares
+def flood_fill(reach, open_south, open_east, goals = None, free = None, jumps = ()):
+    while True:
+        new = spread(reach, open_south, open_east)
+        if free is not None:
+            new = reach | (new & free)
+        for ax, ay, targets in jumps:
+            hit = row_bit(reach, ax, ay)
+            new[hit] |= targets[hit]
+        if goals is not None and (new & goals).any(axis=1).all():
+            return new
+        if np.array_equal(new, reach):
+            return new
+        reach = new
+
+class QuoridorBatchEnv():
+    """
+    Holds n_games Quoridor games as arrays and steps them all at once.
+
+    Rules match QuoridorBoard, including its path check for fences: every
+    player must still be able to reach their goal with pawn moves, stepping
+    round the other pawns and jumping over them as they stand.
+
+    legal_mask gives the legal moves of every game. candidate_mask leaves out
+    the path check, which is most of the work; random_actions and
+    heuristic_actions use it and check only the fence they pick.
+
+    Finished games, and games that hit max_plies, are reset as part of step, so
+    the batch can be stepped forever. Call step with one action per game and
+    it returns the winner of every game that ended on that step (-1 otherwise)
+    and which games ended.
+    """
+
+    def __init__(self, n_games, n_players = 2, max_plies = 200, seed = None):
+        self.n_games = n_games
+        self.n_players = n_players
+        self.max_plies = max_plies
+        self.rng = np.random.default_rng(seed)
+        self.goals = goal_masks(n_players)
+        self.goal_rows = pack_rows(self.goals)
+        self.games = np.arange(n_games)
+
+        self.pawns = np.zeros((n_games, n_players, 2), dtype=np.int8)
+        self.fences = np.zeros((n_games, n_players), dtype=np.int8)
+        self.current_player = np.zeros(n_games, dtype=np.int8)
+        self.plies = np.zeros(n_games, dtype=np.int32)
+        # blocked_south[g, y, x]: the move from (x, y) to (x, y + 1) is blocked
+        self.blocked_south = np.zeros((n_games, 9, 9), dtype=bool)
+        # blocked_east[g, y, x]: the move from (x, y) to (x + 1, y) is blocked
+        self.blocked_east = np.zeros((n_games, 9, 9), dtype=bool)
+        # The same edges as packed rows of open edges, for the flood fills
+        self.open_south = np.zeros((n_games, 9), dtype=np.uint16)
+        self.open_east = np.zeros((n_games, 9), dtype=np.uint16)
+        # Slots where no more fences of each orientation may go, indexed [g, cy - 1, cx - 1]
+        self.horizontal_blocked = np.zeros((n_games, 8, 8), dtype=bool)
+        self.vertical_blocked = np.zeros((n_games, 8, 8), dtype=bool)
+
+        self.total_plies = 0
+        self.total_games = 0
+        self.reset()
+
+    # Put the given games (default all) back to the starting position
+    def reset(self, games = None):
+        if games is None:
+            games = self.games
+        positions, n_fences = start_positions(self.n_players)
+        self.pawns[games] = positions
+        self.fences[games] = n_fences
+        self.current_player[games] = 0
+        self.plies[games] = 0
+        self.blocked_south[games] = False
+        self.blocked_east[games] = False
+        self.open_south[games, :8] = FULL_ROW
+        self.open_east[games] = FULL_ROW >> 1
+        self.horizontal_blocked[games] = False
+        self.vertical_blocked[games] = False
+
+    # Squares taken by pawns, as (N, 9, 9)
+    def occupancy(self):
+        occupied = np.zeros((self.n_games, 9, 9), dtype=bool)
+        for player in range(self.n_players):
+            occupied[self.games, self.pawns[:, player, 1], self.pawns[:, player, 0]] = True
+        return occupied
+
+    # For each game, check the edge from (x, y) in direction is on the board and not fenced off
+    def edge_open(self, x, y, direction):
+        dx, dy = STEPS[direction]
+        nx = x + dx
+        ny = y + dy
+        on_board = (x >= 0) & (x < 9) & (y >= 0) & (y < 9) & (nx >= 0) & (nx < 9) & (ny >= 0) & (ny < 9)
+        cx = np.clip(np.minimum(x, nx), 0, 8)
+        cy = np.clip(np.minimum(y, ny), 0, 8)
+        if dx == 0:
+            blocked = self.blocked_south[self.games, cy, cx]
+        else:
+            blocked = self.blocked_east[self.games, cy, cx]
+        return on_board & ~blocked
+
+    # Legal pawn moves of the player to move in every game, as (N, 12)
+    def pawn_mask(self):
+        mask = np.zeros((self.n_games, N_PAWN_ACTIONS), dtype=bool)
+        occupied = self.occupancy()
+        pawn = self.pawns[self.games, self.current_player].astype(np.int32)
+        x = pawn[:, 0]
+        y = pawn[:, 1]
+
+        def is_occupied(cx, cy):
+            on_board = (cx >= 0) & (cx < 9) & (cy >= 0) & (cy < 9)
+            return on_board & occupied[self.games, np.clip(cy, 0, 8), np.clip(cx, 0, 8)]
+
+        for direction, (dx, dy) in enumerate(STEPS):
+            step_open = self.edge_open(x, y, direction)
+            mx = x + dx
+            my = y + dy
+            blocker = step_open & is_occupied(mx, my)
+            mask[:, direction] = step_open & ~blocker
+
+            # Jump straight over the pawn in the way, if the far square is on the board
+            tx = mx + dx
+            ty = my + dy
+            target_on_board = (tx >= 0) & (tx < 9) & (ty >= 0) & (ty < 9)
+            straight = blocker & target_on_board & self.edge_open(mx, my, direction) & ~is_occupied(tx, ty)
+            mask[:, 4 + direction] = straight
+
+            # Otherwise jump diagonally round it
+            diagonal = blocker & target_on_board & ~straight
+            for side in ((WEST, EAST) if dx == 0 else (NORTH, SOUTH)):
+                sx, sy = STEPS[side]
+                allowed = diagonal & self.edge_open(mx, my, side) & ~is_occupied(mx + sx, my + sy)
+                mask[:, OFFSET_ACTIONS[(dx + sx, dy + sy)]] |= allowed
+        return mask
+
+    # Fences that don't overlap or cross an existing fence, as (N, 128)
+    # Games where the player to move has no fences left get no fence moves
+    def fence_mask(self):
+        has_fences = self.fences[self.games, self.current_player] > 0
+        horizontal = ~self.horizontal_blocked.reshape(self.n_games, N_SLOTS) & has_fences[:, None]
+        vertical = ~self.vertical_blocked.reshape(self.n_games, N_SLOTS) & has_fences[:, None]
+        return np.concatenate([horizontal, vertical], axis=1)
+
+    # Moves of every game that are legal apart from the path check, as (N, ACTION_SIZE)
+    # Fences are not checked for leaving every player a way through
+    def candidate_mask(self):
+        return np.concatenate([self.pawn_mask(), self.fence_mask()], axis=1)
+
+    # Legal moves of every game, as (N, ACTION_SIZE)
+    def legal_mask(self):
+        mask = self.candidate_mask()
+        games, actions = np.nonzero(mask[:, N_PAWN_ACTIONS:])
+        ok = self.fences_keep_paths(games, actions + N_PAWN_ACTIONS)
+        mask[games[~ok], actions[~ok] + N_PAWN_ACTIONS] = False
+        return mask
+
+    # Packed open edge rows for the given games with one extra fence each
+    def open_with(self, games, actions):
+        open_south = self.open_south[games]
+        open_east = self.open_east[games]
+        rows = np.arange(len(games))
+        horizontal = actions < VERTICAL_BASE
+        slots = np.where(horizontal, actions - HORIZONTAL_BASE, actions - VERTICAL_BASE)
+        cx = (slots % 8).astype(np.uint16)
+        cy = slots // 8
+        h = rows[horizontal]
+        open_south[h, cy[horizontal]] &= ~(np.uint16(3) << cx[horizontal])
+        v = rows[~horizontal]
+        open_east[v, cy[~horizontal]] &= ~(np.uint16(1) << cx[~horizontal])
+        open_east[v, cy[~horizontal] + 1] &= ~(np.uint16(1) << cx[~horizontal])
+        return open_south, open_east
+
+    # Jumps over the pawns of the given games, with the given open edges, for flood_fill
+    # Coming from the approach square next to a pawn, a pawn lands where pawn_mask would let it
+    def jumps(self, games, open_south, open_east, occupied):
+        rows = np.arange(len(games))
+        jumps = []
+        for player in range(self.n_players):
+            pawn = self.pawns[games, player].astype(np.int32)
+            x = pawn[:, 0]
+            y = pawn[:, 1]
+            for direction, (dx, dy) in enumerate(STEPS):
+                ax = x - dx
+                ay = y - dy
+                tx = x + dx
+                ty = y + dy
+                target_on_board = (tx >= 0) & (tx < 9) & (ty >= 0) & (ty < 9)
+                approach = target_on_board & row_edge_open(open_south, open_east, ax, ay, direction)
+                straight = approach & row_edge_open(open_south, open_east, x, y, direction) & ~row_bit(occupied, tx, ty)
+                targets = np.zeros((len(games), 9), dtype=np.uint16)
+                targets[rows[straight], ty[straight]] |= ROW_BITS[tx[straight]]
+                diagonal = approach & ~straight
+                for side in ((WEST, EAST) if dx == 0 else (NORTH, SOUTH)):
+                    sx, sy = STEPS[side]
+                    allowed = diagonal & row_edge_open(open_south, open_east, x, y, side) & ~row_bit(occupied, x + sx, y + sy)
+                    targets[rows[allowed], y[allowed] + sy] |= ROW_BITS[x[allowed] + sx]
+                if targets.any():
+                    jumps.append((ax, ay, targets))
+        return jumps
+
+    # Check every player can still reach their goal after each fence action
+    # games and actions are matching 1-D arrays; returns a boolean array
+    def fences_keep_paths(self, games, actions):
+        if len(games) == 0:
+            return np.zeros(0, dtype=bool)
+        open_south, open_east = self.open_with(games, actions)
+        rows = np.arange(len(games))
+        occupied = np.zeros((len(games), 9), dtype=np.uint16)
+        for player in range(self.n_players):
+            pawn = self.pawns[games, player]
+            occupied[rows, pawn[:, 1]] |= ROW_BITS[pawn[:, 0]]
+        # Getting through by steps round the other pawns is enough, and settles most fences
+        # without jumps; only the rest are searched again with them
+        ok = self.players_reach_goals(games, open_south, open_east, occupied)
+        retry = rows[~ok]
+        if len(retry):
+            jumps = self.jumps(games[retry], open_south[retry], open_east[retry], occupied[retry])
+            ok[retry] = self.players_reach_goals(games[retry], open_south[retry], open_east[retry], occupied[retry], jumps)
+        return ok
+
+    # Check every player of the given games can reach their goal with steps to free squares
+    # and the given jumps, with open edges and pawn squares as (M, 9) packed rows
+    def players_reach_goals(self, games, open_south, open_east, occupied, jumps = ()):
+        rows = np.arange(len(games))
+        free = FULL_ROW & ~occupied
+        ok = np.ones(len(games), dtype=bool)
+        for player in range(self.n_players):
+            reach = np.zeros((len(games), 9), dtype=np.uint16)
+            pawn = self.pawns[games, player]
+            reach[rows, pawn[:, 1]] = ROW_BITS[pawn[:, 0]]
+            # Pawns never land on an occupied square, so those never count as reaching the goal
+            goal = self.goal_rows[player] & free
+            reach = flood_fill(reach, open_south, open_east, goal, free, jumps)
+            ok &= (reach & goal).any(axis=1)
+        return ok
+
+    # Distance to goal for the player to move, ignoring pawns, from the squares (x, y)
+    # x and y are (N, K) arrays of squares on the board; returns (N, K) distances,
+    # with squares that can't reach the goal at 81
+    def target_distances(self, x, y):
+        seen = self.goal_rows[self.current_player]
+        bits = ROW_BITS[x]
+        games = self.games[:, None]
+        distance = np.zeros(x.shape, dtype=np.int16)
+        for step in range(81):
+            hit = (seen[games, y] & bits) != 0
+            if hit.all():
+                break
+            # Every square not reached yet is at least one step further away
+            distance += ~hit
+            new = spread(seen, self.open_south, self.open_east)
+            if np.array_equal(new, seen):
+                distance[~hit] = 81
+                break
+            seen = new
+        return distance
+
+    # Pick one legal action per game from mask: a random fence with probability
+    # fence_probability, otherwise a random pawn move. Picked fences are path checked
+    # and replaced by a pawn move if they would shut a player in.
+    def random_actions(self, mask = None, fence_probability = 0.2):
+        if mask is None:
+            mask = self.candidate_mask()
+        pawn_scores = self.rng.random((self.n_games, N_PAWN_ACTIONS)) * mask[:, :N_PAWN_ACTIONS]
+        return self.add_fences(pawn_scores, mask, fence_probability)
+
+    # Like random_actions, but pawn moves go down the shortest path, except with probability epsilon
+    def heuristic_actions(self, mask = None, fence_probability = 0.1, epsilon = 0.1):
+        if mask is None:
+            mask = self.candidate_mask()
+        pawn = self.pawns[self.games, self.current_player].astype(np.int32)
+        tx = np.clip(pawn[:, 0:1] + PAWN_OFFSETS[:, 0], 0, 8)
+        ty = np.clip(pawn[:, 1:2] + PAWN_OFFSETS[:, 1], 0, 8)
+        target_distance = self.target_distances(tx, ty)
+        # Higher is better; ties broken at random
+        pawn_scores = (100.0 - target_distance) + self.rng.random((self.n_games, N_PAWN_ACTIONS))
+        explore = self.rng.random(self.n_games) < epsilon
+        pawn_scores[explore] = self.rng.random((explore.sum(), N_PAWN_ACTIONS)) + 1.0
+        pawn_scores = np.where(mask[:, :N_PAWN_ACTIONS], pawn_scores, 0.0)
+        return self.add_fences(pawn_scores, mask, fence_probability)
+
+    # Best pawn move by score, swapped for a random path checked fence in some games
+    # A game with no pawn move and no usable fence passes (action -1)
+    def add_fences(self, pawn_scores, mask, fence_probability):
+        actions = pawn_scores.argmax(axis=1)
+        stuck = ~mask[:, :N_PAWN_ACTIONS].any(axis=1)
+        actions[stuck] = -1
+        fence_legal = mask[:, N_PAWN_ACTIONS:]
+        wants_fence = ((self.rng.random(self.n_games) < fence_probability) | stuck) & fence_legal.any(axis=1)
+        games = self.games[wants_fence]
+        if len(games):
+            fence_scores = self.rng.random((len(games), 2 * N_SLOTS)) * fence_legal[games]
+            fences = fence_scores.argmax(axis=1) + N_PAWN_ACTIONS
+            ok = self.fences_keep_paths(games, fences)
+            actions[games[ok]] = fences[ok]
+        return actions
+
+    # Play one action in every game (-1 to pass), then reset the games that finished
+    # Returns (winners, done): the winning player of each game that ended this step or -1,
+    # and a boolean array of the games that ended
+    def step(self, actions):
+        actions = np.asarray(actions)
+        player = self.current_player.astype(np.int64)
+
+        # Pawn moves
+        moving = (actions >= 0) & (actions < N_PAWN_ACTIONS)
+        games = self.games[moving]
+        self.pawns[games, player[moving]] += PAWN_OFFSETS[actions[moving]]
+
+        # Fences
+        horizontal = (actions >= HORIZONTAL_BASE) & (actions < VERTICAL_BASE)
+        if horizontal.any():
+            games = self.games[horizontal]
+            slots = actions[horizontal] - HORIZONTAL_BASE
+            cx = slots % 8
+            cy = slots // 8
+            self.blocked_south[games, cy, cx] = True
+            self.blocked_south[games, cy, cx + 1] = True
+            self.open_south[games, cy] &= ~(np.uint16(3) << cx.astype(np.uint16))
+            self.horizontal_blocked[games, cy, cx] = True
+            self.horizontal_blocked[games, cy, np.maximum(cx - 1, 0)] = True
+            self.horizontal_blocked[games, cy, np.minimum(cx + 1, 7)] = True
+            self.vertical_blocked[games, cy, cx] = True
+            self.fences[games, player[horizontal]] -= 1
+        vertical = actions >= VERTICAL_BASE
+        if vertical.any():
+            games = self.games[vertical]
+            slots = actions[vertical] - VERTICAL_BASE
+            cx = slots % 8
+            cy = slots // 8
+            self.blocked_east[games, cy, cx] = True
+            self.blocked_east[games, cy + 1, cx] = True
+            self.open_east[games, cy] &= ~(np.uint16(1) << cx.astype(np.uint16))
+            self.open_east[games, cy + 1] &= ~(np.uint16(1) << cx.astype(np.uint16))
+            self.vertical_blocked[games, cy, cx] = True
+            self.vertical_blocked[games, np.maximum(cy - 1, 0), cx] = True
+            self.vertical_blocked[games, np.minimum(cy + 1, 7), cx] = True
+            self.horizontal_blocked[games, cy, cx] = True
+            self.fences[games, player[vertical]] -= 1
+
+        # The player who just moved is the only one who can have won
+        pawn = self.pawns[self.games, player]
+        won = self.goals[player, pawn[:, 1], pawn[:, 0]]
+        winners = np.where(won, player, -1)
+
+        self.plies += 1
+        self.current_player = ((player + 1) % self.n_players).astype(np.int8)
+        done = won | (self.plies >= self.max_plies)
+
+        self.total_plies += self.n_games
+        finished = self.games[done]
+        self.total_games += len(finished)
+        if len(finished):
+            self.reset(finished)
+        return winners, done
@@ -1,12 +1,53 @@
 from collections import namedtuple
+from copy import deepcopy
 import numpy as np
 from Coordinate import Coordinate
-from QuoridorMove import QuoridorMove
+from QuoridorMove import QuoridorMove, QuoridorMoveType
+from ReachabilityCache import ReachabilityCache
+from DistanceField import DistanceField, open_edges
+from WallConnectivity import WallConnectivity
+from FloodFill import FloodFill
+import Zobrist
 
 class Fence:
-    def __init__(self, first, is_horizontal):
-        self.first = first
-        self.is_horizontal = is_horizontal
+    """
+    A fence, by its first (top or left) corner and orientation.
+
+    Fences can't be changed once made. There are only 128 places a fence can
+    go, and each of them has one shared Fence, so Fence(first, is_horizontal)
+    for a position on the board returns the same object every time.
+    """
+
+    __slots__ = ("first", "is_horizontal")
+
+    def __new__(cls, first, is_horizontal):
+        key = (is_horizontal, first.x, first.y)
+        fence = _FENCES.get(key)
+        if fence is None:
+            fence = object.__new__(cls)
+            object.__setattr__(fence, "first", first)
+            object.__setattr__(fence, "is_horizontal", is_horizontal)
+            if fence.is_on_board():
+                _FENCES[key] = fence
+        return fence
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Fence is immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (Fence, (self.first, self.is_horizontal))
+
+    # Check the fence lies along the grid lines inside the board
+    def is_on_board(self):
+        if self.is_horizontal:
+            return 0 <= self.first.x < 8 and 1 <= self.first.y < 9
+        return 1 <= self.first.x < 9 and 0 <= self.first.y < 8
 
     # See if you can move from current to final without hitting this wall
     def test_move(self, current, final):
@@ -61,6 +102,71 @@ class Fence:
         else:
             return other.first.x + 1 == self.first.x and self.first.y + 1 == other.first.y
 
+# Shared fences, by (is_horizontal, x, y)
+_FENCES = {}
+
+# Squares are numbered y * 9 + x
+N_CELLS = 81
+COORDS = [Coordinate(i % 9, i // 9) for i in range(N_CELLS)]
+
+# Directions in the order get_legal_move_positions tries them
+WEST, NORTH, EAST, SOUTH = range(4)
+OFFSETS = [(-1, 0), (0, -1), (1, 0), (0, 1)]
+OPPOSITE = [EAST, SOUTH, WEST, NORTH]
+# Sides a pawn can jump to when it can't jump straight on in a direction
+SIDES = [(NORTH, SOUTH), (WEST, EAST), (NORTH, SOUTH), (WEST, EAST)]
+
+# NEIGHBOURS[cell][direction] is the neighbouring square, or -1 off the board
+NEIGHBOURS = []
+for cell in range(N_CELLS):
+    x, y = cell % 9, cell // 9
+    row = []
+    for dx, dy in OFFSETS:
+        nx, ny = x + dx, y + dy
+        row.append(ny * 9 + nx if 0 <= nx < 9 and 0 <= ny < 9 else -1)
+    NEIGHBOURS.append(row)
+
+# The 128 places a fence can go are numbered by the corner point in the middle of the fence:
+# horizontal fences (y - 1) * 8 + x, vertical fences 64 + y * 8 + x - 1
+N_FENCE_SLOTS = 128
+
+def fence_slot(fence):
+    if fence.is_horizontal:
+        return (fence.first.y - 1) * 8 + fence.first.x
+    return 64 + fence.first.y * 8 + fence.first.x - 1
+
+# FENCE_SLOTS[slot] is the fence in each slot, in the order get_legal_fences lists them
+FENCE_SLOTS = [None] * N_FENCE_SLOTS
+FENCE_ORDER = []
+for _ix in range(0, 8):
+    for _iy in range(1, 9):
+        _fence = Fence(Coordinate(_ix, _iy), True)
+        FENCE_SLOTS[fence_slot(_fence)] = _fence
+        FENCE_ORDER.append(fence_slot(_fence))
+for _ix in range(1, 9):
+    for _iy in range(0, 8):
+        _fence = Fence(Coordinate(_ix, _iy), False)
+        FENCE_SLOTS[fence_slot(_fence)] = _fence
+        FENCE_ORDER.append(fence_slot(_fence))
+
+# CONFLICTS[slot] lists the slots a fence there rules out: its own, the two
+# it would overlap and the one of the other orientation it would cross
+CONFLICTS = [[other for other in range(N_FENCE_SLOTS) if FENCE_SLOTS[slot].check_conflict(FENCE_SLOTS[other])]
+             for slot in range(N_FENCE_SLOTS)]
+
+# Orders generate_moves can produce moves in
+PAWNS_FIRST = "pawns_first"
+PATH_FIRST = "path_first"
+
+# Squares and directions whose edge a fence blocks, as (cell, direction bit) pairs
+def fence_edges(fence):
+    x, y = fence.first.x, fence.first.y
+    if fence.is_horizontal:
+        cell = (y - 1) * 9 + x
+        return [(cell, 1 << SOUTH), (cell + 9, 1 << NORTH), (cell + 1, 1 << SOUTH), (cell + 10, 1 << NORTH)]
+    cell = y * 9 + x - 1
+    return [(cell, 1 << EAST), (cell + 1, 1 << WEST), (cell + 9, 1 << EAST), (cell + 10, 1 << WEST)]
+
 class QuoridorBoard:
     """
     Quoridor Board.
@@ -73,6 +179,12 @@ class QuoridorBoard:
         self.vertical_fences = []
        # self.forbidden_moves = {}
         self.check_possible = True
+        self.reachability = ReachabilityCache()
+        self.distance_field = DistanceField()
+        self.connectivity = WallConnectivity()
+        self.flood_fill = FloodFill()
+        # XOR of the Zobrist keys of the placed fences only
+        self.fence_hash = 0
 
         if n_players == 2:
             self.pawns = [Coordinate(4, 0), Coordinate(4, 8)]
@@ -83,12 +195,45 @@ class QuoridorBoard:
         else:
             raise Exception("Illegal number of players")
 
+        # blocked[cell] has bit d set if a fence blocks the edge leaving cell in direction d
+        self.blocked = [0] * N_CELLS
+        # occupancy[cell] is True if a pawn stands on the square
+        self.occupancy = [False] * N_CELLS
+        for pawn in self.pawns:
+            self.occupancy[pawn.y * 9 + pawn.x] = True
+        # forbidden[slot] counts the placed fences that rule the slot out, so taking one back is a decrement
+        self.forbidden = [0] * N_FENCE_SLOTS
+
         self.current_player = 0
+        # Number of moves played since the start of the game
+        self.ply = 0
+        self.undo_stack = []
+        self.hash = Zobrist.board_hash(self)
+
+    # Undo entries are never changed, so copies share them, apart from the
+    # reachability paths which go back into use and get changed on undo
+    def __deepcopy__(self, memo):
+        board = object.__new__(type(self))
+        memo[id(self)] = board
+        for name, value in self.__dict__.items():
+            if name == "undo_stack":
+                board.undo_stack = [entry[:4] + (dict(entry[4]),) for entry in value]
+            elif name in ("blocked", "occupancy", "forbidden"):
+                # Flat lists of numbers only need a plain copy
+                setattr(board, name, list(value))
+            else:
+                setattr(board, name, deepcopy(value, memo))
+        return board
 
     # Move the pawn
     def move_pawn(self, player, new_coord):
         if self.is_legal_move(player, new_coord):
+            old_coord = self.pawns[player]
             self.pawns[player] = new_coord
+            self.occupancy[old_coord.y * 9 + old_coord.x] = False
+            self.occupancy[new_coord.y * 9 + new_coord.x] = True
+            self.hash ^= Zobrist.pawn_key(player, old_coord) ^ Zobrist.pawn_key(player, new_coord)
+            self.reachability.pawn_moved(player, old_coord, new_coord)
         else:
             raise Exception("Illegal move!")
 
@@ -97,21 +242,100 @@ class QuoridorBoard:
         if self.fences[player] == 0:
             raise Exception("No fences remain!")
         new_fence = Fence(coord1, is_horizontal)
-        for fence in self.all_fences():
-            if fence.check_conflict(new_fence):
-                raise Exception("Fence in illegal location!")
+        if not new_fence.is_on_board() or self.forbidden[fence_slot(new_fence)]:
+            raise Exception("Fence in illegal location!")
         if new_fence.is_horizontal:
             self.horizontal_fences.append(new_fence)
         else:
             self.vertical_fences.append(new_fence)
+        self.block_edges(new_fence)
+        self.claim_slots(new_fence)
+        self.reachability.fence_added(is_horizontal, coord1.x, coord1.y)
+        self.fence_hash ^= Zobrist.fence_key(coord1, is_horizontal)
 
         #for coord_pair in new_fence.forbidden_moves():
         #    if coord_pair[0] not in self.forbidden_moves:
         #        self.forbidden_moves[coord_pair[0]] = []
         #    self.forbidden_moves[coord_pair[0]].append(coord_pair[1])
 
+        self.hash ^= Zobrist.fence_key(coord1, is_horizontal) ^ Zobrist.fences_left_key(player, self.fences[player]) ^ Zobrist.fences_left_key(player, self.fences[player] - 1)
         self.fences[player] -= 1
 
+    # Play a move and pass the turn, remembering enough to take it back with undo
+    def apply(self, move):
+        if move.type == QuoridorMoveType.MOVE:
+            previous = self.pawns[move.player]
+        else:
+            previous = None
+        self.undo_stack.append((move, previous, self.current_player, self.hash, dict(self.reachability.paths)))
+        try:
+            move.execute(self)
+        except Exception:
+            self.undo_stack.pop()
+            raise
+        self.next_player()
+
+    # Take back the last move played with apply, and return it
+    def undo(self):
+        move, previous, player, board_hash, paths = self.undo_stack.pop()
+        if move.type == QuoridorMoveType.MOVE:
+            self.restore_pawn(move.player, previous)
+        else:
+            self.remove_last_fence(move.player, move.is_horizontal)
+        self.current_player = player
+        self.hash = board_hash
+        self.reachability.paths = paths
+        self.ply -= 1
+        return move
+
+    # Put a pawn back where it was, without checking the move is legal
+    def restore_pawn(self, player, coord):
+        old_coord = self.pawns[player]
+        self.occupancy[old_coord.y * 9 + old_coord.x] = False
+        self.occupancy[coord.y * 9 + coord.x] = True
+        self.pawns[player] = coord
+
+    # Take away the most recently placed fence of an orientation and give it back to its player
+    def remove_last_fence(self, player, is_horizontal):
+        if is_horizontal:
+            fence = self.horizontal_fences.pop()
+        else:
+            fence = self.vertical_fences.pop()
+        self.unblock_edges(fence)
+        self.release_slots(fence)
+        self.fence_hash ^= Zobrist.fence_key(fence.first, is_horizontal)
+        self.fences[player] += 1
+
+    # Open edges as 81-bit integers (open_south, open_east), as DistanceField.open_edges
+    def edge_masks(self):
+        return open_edges(self)
+
+    # Mark the edges a fence blocks
+    def block_edges(self, fence):
+        for cell, bit in fence_edges(fence):
+            self.blocked[cell] |= bit
+
+    # Clear the edges a fence blocked; fences never share an edge
+    def unblock_edges(self, fence):
+        for cell, bit in fence_edges(fence):
+            self.blocked[cell] &= ~bit
+
+    # Rule out the slots a placed fence conflicts with
+    def claim_slots(self, fence):
+        forbidden = self.forbidden
+        for slot in CONFLICTS[fence_slot(fence)]:
+            forbidden[slot] += 1
+
+    def release_slots(self, fence):
+        forbidden = self.forbidden
+        for slot in CONFLICTS[fence_slot(fence)]:
+            forbidden[slot] -= 1
+
+    # Slots no placed fence conflicts with, in the order get_legal_fences lists them
+    def open_slots(self):
+        forbidden = self.forbidden
+        return [slot for slot in FENCE_ORDER if not forbidden[slot]]
+
     # Check if this move is allowed
     def is_legal_move(self, player, new_coord):
         return new_coord in self.get_legal_move_positions_for_player(player)
@@ -125,6 +349,10 @@ class QuoridorBoard:
 
     # Check if you can move from current to new_coord without going through any fences
     def check_fences(self, current, new_coord):
+        dx = new_coord.x - current.x
+        dy = new_coord.y - current.y
+        if abs(dx) + abs(dy) == 1:
+            return not (self.blocked[current.y * 9 + current.x] >> OFFSETS.index((dx, dy))) & 1
         return (current.x == new_coord.x and self.test_fences(self.horizontal_fences, current, new_coord)) or (current.y == new_coord.y and self.test_fences(self.vertical_fences, current, new_coord))
         #if current not in self.forbidden_moves:
         #    return True
@@ -135,36 +363,23 @@ class QuoridorBoard:
     def possible_jumps(self, current, move):
         if not self.is_occupied(move):
             return []
-        # Choose target jump
-        if current.x == move.x:
-            if current.y > move.y:
-                target = Coordinate(current.x, current.y - 2)
-            else:
-                target = Coordinate(current.x, current.y + 2)
-        else:
-            if current.x > move.x:
-                target = Coordinate(current.x - 2, current.y)
-            else:
-                target = Coordinate(current.x + 2, current.y)
+        direction = OFFSETS.index((move.x - current.x, move.y - current.y))
+        return [COORDS[cell] for cell in self.jump_cells(move.y * 9 + move.x, direction)]
 
-        if not target.is_legal():
+    # Squares reachable by jumping over the pawn on cell, arriving from direction
+    def jump_cells(self, cell, direction):
+        target = NEIGHBOURS[cell][direction]
+        if target < 0:
             return []
-
-        if self.check_fences(move, target) and not self.is_occupied(target):
+        blocked = self.blocked[cell]
+        if not (blocked >> direction) & 1 and not self.occupancy[target]:
             return [target]
-        else:
-            # Get new targets
-            if current.x == move.x:
-                new_targets = [Coordinate(current.x - 1, move.y), Coordinate(current.x + 1, move.y)]
-            else:
-                new_targets = [Coordinate(move.x, current.y - 1), Coordinate(move.x, current.y + 1)]
-
-            final_moves = []
-            for new_target in new_targets:
-                if self.check_fences(move, new_target) and not self.is_occupied(new_target):
-                    final_moves.append(new_target)
-            return final_moves
-
+        cells = []
+        for side in SIDES[direction]:
+            new_target = NEIGHBOURS[cell][side]
+            if new_target >= 0 and not (blocked >> side) & 1 and not self.occupancy[new_target]:
+                cells.append(new_target)
+        return cells
 
     # Gets all legal moves for a given player's pawn - pawn moves only
     def get_legal_move_positions_for_player(self, player):
@@ -172,22 +387,21 @@ class QuoridorBoard:
 
     # These are moves for the pawn moves only
     def get_legal_move_positions(self, current):
-        moves = []
-        potential_moves = [Coordinate(current.x - 1, current.y), Coordinate(current.x, current.y - 1), Coordinate(current.x + 1, current.y), Coordinate(current.x, current.y + 1)]
-        for move in potential_moves:
-            # Make sure it's legal
-            if not move.is_legal():
+        return [COORDS[cell] for cell in self.move_cells(current.y * 9 + current.x)]
+
+    # Squares a pawn standing on cell can reach in one move, jumps included
+    def move_cells(self, cell):
+        cells = []
+        blocked = self.blocked[cell]
+        occupancy = self.occupancy
+        for direction, move in enumerate(NEIGHBOURS[cell]):
+            if move < 0 or (blocked >> direction) & 1:
                 continue
-            # Check for fences
-            if self.check_fences(current, move):
-                # Check for occupied spaces
-                if self.is_occupied(move):
-                    for jump in self.possible_jumps(current, move):
-                        moves.append(jump)
-                else:
-                    moves.append(move)
-
-        return moves
+            if occupancy[move]:
+                cells.extend(self.jump_cells(move, direction))
+            else:
+                cells.append(move)
+        return cells
 
     def all_fences(self):
         return self.horizontal_fences + self.vertical_fences
@@ -197,82 +411,52 @@ class QuoridorBoard:
         if (self.fences[player] == 0):
             return []
         fences = []
-        # Horizontal 
-        for ix in range(0, 8):
-            for iy in range(1, 9):
-                potential_fence = Fence(Coordinate(ix, iy), True)
-                found_conflict = False
-                for fence in self.all_fences():
-                    if fence.check_conflict(potential_fence):
-                        found_conflict = True
-                        break
-                if found_conflict:
+        for slot in self.open_slots():
+            potential_fence = FENCE_SLOTS[slot]
+            if self.check_possible:
+                if not self.check_if_possible(potential_fence):
                     continue
-                if self.check_possible:
-                    if not self.check_if_possible(potential_fence):
-                        continue
-                fences.append(QuoridorMove.add_fence(potential_fence, self.current_player))
-        # Vertical
-        for ix in range(1, 9):
-            for iy in range(0, 8):
-                potential_fence = Fence(Coordinate(ix, iy), False)
-                found_conflict = False
-                for fence in self.all_fences():
-                    if fence.check_conflict(potential_fence):
-                        found_conflict = True
-                        break
-                if found_conflict:
-                    continue
-                if self.check_possible:
-                    if not self.check_if_possible(potential_fence):
-                        continue
-                fences.append(QuoridorMove.add_fence(potential_fence, self.current_player))
+            fences.append(QuoridorMove.add_fence(potential_fence, self.current_player))
         return fences
 
     # Check to make sure it is still possible to get across the board
     def check_if_possible(self, new_fence):
+        is_horizontal, x, y = new_fence.is_horizontal, new_fence.first.x, new_fence.first.y
+        players = []
         for i_player in range(len(self.pawns)):
-            if not self.check_if_possible_single_player(i_player, new_fence):
-                return False
-        return True
+            # Only search again if the fence gets in the way of the path we already know
+            if not self.reachability.path_cut(self, i_player, is_horizontal, x, y):
+                continue
+            # Nor if the fence closes no loop of obstacles around anything
+            if not self.connectivity.may_cut_off(self, i_player, is_horizontal, x, y):
+                continue
+            players.append(i_player)
+        # The players left are searched for together
+        return not players or self.flood_fill.players_reach_goals(self, players, is_horizontal, x, y)
 
-    # Check to make sure it is still possible to get across the board for a single player
-    def check_if_possible_single_player(self, player, new_fence):
+    # Find a shortest sequence of pawn moves to the goal, starting with the current position
+    # Returns None if the goal can't be reached
+    def get_shortest_path(self, player):
         win_condition = self.get_target(player)
-
-        # Provisionally add the new fence
-        if new_fence.is_horizontal:
-            self.horizontal_fences.append(new_fence)
-        else:
-            self.vertical_fences.append(new_fence)
-
-        # Dijkstra's algorithm, modified
-        already_tested = {}
-        # Start with current pawn location
-        to_be_tested = [self.pawns[player]]
+        start = self.pawns[player]
+        came_from = {start: None}
+        to_be_tested = [start]
         while to_be_tested:
             new_to_be_tested = []
             for point in to_be_tested:
                 for new_point in self.get_legal_move_positions(point):
+                    if new_point in came_from:
+                        continue
+                    came_from[new_point] = point
                     if win_condition(new_point):
-                        # Remove the added fence
-                        if new_fence.is_horizontal:
-                            self.horizontal_fences.pop(len(self.horizontal_fences) - 1)
-                        else:
-                            self.vertical_fences.pop(len(self.vertical_fences) - 1)
-                        return True
-                    if not new_point in already_tested:
-                        already_tested[new_point] = 0
-                        new_to_be_tested.append(new_point)
+                        path = [new_point]
+                        while came_from[path[-1]] is not None:
+                            path.append(came_from[path[-1]])
+                        path.reverse()
+                        return path
+                    new_to_be_tested.append(new_point)
             to_be_tested = new_to_be_tested
-
-        # This means no win condition was found
-        # So remove the added fence
-        if new_fence.is_horizontal:
-            self.horizontal_fences.pop(len(self.horizontal_fences) - 1)
-        else:
-            self.vertical_fences.pop(len(self.vertical_fences) - 1)
-        return False
+        return None
 
     # Return a lambda function which determines if a coordinate satisfied the win condition for a particular player
     def get_target(self, player):
@@ -292,15 +476,75 @@ class QuoridorBoard:
 
     # Check if a square is occupied by another pawn
     def is_occupied(self, coord):
-        for player in self.pawns:
-            if coord == player:
-                return True
-        return False
+        return 0 <= coord.x < 9 and 0 <= coord.y < 9 and self.occupancy[coord.y * 9 + coord.x]
+
+    # Fences (is_horizontal, x, y) that cut an opponent's shortest path, with the
+    # earliest step of any opponent's path they cut
+    def fence_cuts(self, player):
+        cuts = {}
+        for opponent in range(len(self.pawns)):
+            if opponent != player:
+                for fence, step in self.reachability.cuts(self, opponent).items():
+                    cuts[fence] = min(step, cuts.get(fence, step))
+        return cuts
 
     # Gets a list of all possible moves
     def get_valid_moves(self):
         return self.get_legal_moves_for_player(self.current_player) + self.get_legal_fences(self.current_player)
 
+    # The moves of get_valid_moves, generated one at a time
+    #
+    # order is PAWNS_FIRST, the order of get_valid_moves, or PATH_FIRST: pawn
+    # moves with the step along the player's shortest path first, then fences
+    # by how early they cut an opponent's shortest path, then the other fences.
+    # A fence's path check only runs when the generator gets to it, so a caller
+    # that stops early skips the rest. With relevant_only, fences that cut no
+    # opponent's path are left out. first is a move to try before all others,
+    # if it is one of the moves that would be generated.
+    #
+    # The board can be changed between moves as long as it is put back, as
+    # with apply and undo.
+    def generate_moves(self, order = PAWNS_FIRST, first = None, relevant_only = False):
+        player = self.current_player
+        pawn_moves = self.get_legal_moves_for_player(player)
+        if order == PATH_FIRST:
+            path = self.reachability.path(self, player)
+            next_step = path[1] if path is not None and len(path) > 1 else None
+            pawn_moves.sort(key=lambda move: next_step is None or not move.coord == next_step)
+
+        slots = self.open_slots() if self.fences[player] > 0 else []
+        if slots and (order == PATH_FIRST or relevant_only):
+            cuts = self.fence_cuts(player)
+            # Fences that cut no path go after all those that do
+            steps = {}
+            for slot in slots:
+                fence = FENCE_SLOTS[slot]
+                steps[slot] = cuts.get((fence.is_horizontal, fence.first.x, fence.first.y), N_CELLS * len(self.pawns))
+            if relevant_only:
+                slots = [slot for slot in slots if steps[slot] < N_CELLS * len(self.pawns)]
+            if order == PATH_FIRST:
+                slots.sort(key=lambda slot: steps[slot])
+
+        if first is not None:
+            if first.type == QuoridorMoveType.MOVE:
+                if first in pawn_moves:
+                    pawn_moves.remove(first)
+                    yield first
+            else:
+                fence = Fence(first.coord, first.is_horizontal)
+                slot = fence_slot(fence) if fence.is_on_board() else None
+                if first.player == player and slot in slots:
+                    slots.remove(slot)
+                    if not self.check_possible or self.check_if_possible(fence):
+                        yield first
+
+        yield from pawn_moves
+        for slot in slots:
+            fence = FENCE_SLOTS[slot]
+            if self.check_possible and not self.check_if_possible(fence):
+                continue
+            yield QuoridorMove.add_fence(fence, player)
+
     def get_legal_moves_for_player(self, player):
         legal_moves = []
         for move in self.get_legal_move_positions_for_player(player):
@@ -309,6 +553,7 @@ class QuoridorBoard:
 
     # Switch to next player
     def next_player(self):
+        self.hash ^= Zobrist.side_key(self.current_player)
         if len(self.pawns) == 2:
             if self.current_player == 1:
                 self.current_player = 0
@@ -319,6 +564,8 @@ class QuoridorBoard:
                 self.current_player = 0
             else:
                 self.current_player += 1
+        self.hash ^= Zobrist.side_key(self.current_player)
+        self.ply += 1
         return self.current_player
 
     # Get a number determining the win state
@@ -1,44 +1,114 @@
 #sys.path.append('..')
 from QuoridorBoard import QuoridorBoard
-from QuoridorVisualizer import QuoridorVisualizer
+import QuoridorActions
+from QuoridorMove import QuoridorMove
+from MoveList import MoveList
+import Symmetry
 from copy import deepcopy
+import numpy as np
 
 class QuoridorGame:
     """
     Quoridor Game class implementing the alpha-zero-general Game interface.
+
+    visualize=True opens a pygame window; pygame is only imported then. A
+    renderer, such as a HeadlessRenderer, is used in place of the window to
+    draw the boards the game displays.
     """
 
-    def __init__(self, n_players = 2, visualize = False, thorough_check = True):
-        self._base_board = QuoridorBoard(n_players)
-        self._base_board.check_possible = thorough_check
+    def __init__(self, n_players = 2, visualize = False, thorough_check = True, renderer = None):
+        self.n_players = n_players
+        self.thorough_check = thorough_check
+        self._base_board = self.newBoard()
+        # Reused by getValidMoves so no mask is allocated per call
+        self._valid_moves = np.zeros(QuoridorActions.ACTION_SIZE, dtype=np.uint8)
         self.visualize = visualize
-        if visualize:
+        self.visualizer = renderer
+        if visualize and renderer is None:
+            from QuoridorVisualizer import QuoridorVisualizer
             self.visualizer = QuoridorVisualizer()
 
+    def newBoard(self):
+        board = QuoridorBoard(self.n_players)
+        board.check_possible = self.thorough_check
+        return board
+
     def getInitBoard(self):
+        "Starts a new game on a fresh board"
+        self._base_board = self.newBoard()
         return self._base_board
 
     def getActionSize(self):
-        return self._base_board.width
+        "Number of actions in the fixed encoding of QuoridorActions"
+        return QuoridorActions.ACTION_SIZE
 
-    def getNextState(self, board, player, action):
-        """Returns a copy of the board with updated move, original board is unmodified."""
+    def getNextState(self, board, player, action, in_place = False):
+        """
+        Returns a copy of the board with updated move, original board is unmodified.
+        action is a QuoridorMove or an action number from QuoridorActions.
+
+        With in_place=True the move is applied to board itself with board.apply,
+        so no copy is made and board.undo() takes it back. Search agents use this
+        to walk the game tree without allocating a board per node.
+        """
+        if not isinstance(action, QuoridorMove):
+            action = QuoridorActions.action_to_move(board, int(action))
+        if in_place:
+            board.apply(action)
+            return board, board.current_player
         b = deepcopy(board)
         action.execute(b)
         next_player = b.next_player()
         return b, next_player
 
     def getValidMoves(self, board, player):
-        "Any zero value in top row in a valid move"
-        return self._base_board.get_valid_moves()
+        """
+        Binary vector of length getActionSize(), 1 for the legal actions of the
+        player to move. The same array is filled in on every call, so copy it
+        to keep it past the next one.
+        """
+        return QuoridorActions.valid_mask(board, self._valid_moves)
+
+    def getValidMoveList(self, board, player):
+        """
+        Legal moves of the player to move, as QuoridorMove objects. The list is
+        generated as it is read, so a player that takes the first pawn move it
+        likes never has the fences path checked.
+        """
+        return MoveList(board.generate_moves())
+
+    def actionToMove(self, board, action):
+        return QuoridorActions.action_to_move(board, action)
+
+    def moveToAction(self, board, move):
+        return QuoridorActions.move_to_action(board, move)
 
     def getGameEnded(self, board):
-        return self._base_board.get_win_state()
+        return board.get_win_state()
 
     def getCanonicalForm(self, board, player):
-        return deepcopy(board) 
+        """
+        A copy of the board. Players choose their move on it and the move is
+        played on the original, so it isn't turned to a canonical image; caches
+        that want one entry for symmetric positions key on Symmetry.canonical_hash.
+        """
+        return deepcopy(board)
+
+    def getSymmetries(self, board, pi):
+        """
+        [(board, pi)] for every symmetry of the board, the position itself
+        first. pi is a policy over the actions of QuoridorActions and is moved
+        with the board, so each training sample gives four without replaying
+        the game.
+        """
+        return [(board if symmetry.is_identity else symmetry.board(board), symmetry.policy(pi))
+                for symmetry in Symmetry.symmetries(board)]
+
+    def stringRepresentation(self, board):
+        "Zobrist hash of the position, as a hex string"
+        return "%016x" % board.hash
 
     def display(self, board):
-        if self.visualize:
+        if self.visualizer is not None:
             self.visualizer.draw_board(board)
 
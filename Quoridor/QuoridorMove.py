@@ -8,22 +8,37 @@ class QuoridorMoveType(Enum):
 class QuoridorMove(object):
     """
     One move in Quoridor
+
+    Moves can't be changed once made. Every pawn move to a square and every
+    fence, for each player, is made once and shared, so move_pawn and
+    add_fence return the same object for the same move.
     """
 
+    __slots__ = ("type", "coord", "is_horizontal", "player", "_key", "_hash")
+
     def move_pawn(new_coord, player):
-        move = QuoridorMove()
-        move.type = QuoridorMoveType.MOVE
-        move.coord = new_coord
-        move.player = player
-        return move
+        if 0 <= new_coord.x < 9 and 0 <= new_coord.y < 9 and 0 <= player < MAX_PLAYERS:
+            move = _PAWN_MOVES[player][new_coord.y * 9 + new_coord.x]
+            if move is None:
+                move = _make_move(QuoridorMoveType.MOVE, Coordinate(new_coord.x, new_coord.y), None, player)
+                _PAWN_MOVES[player][new_coord.y * 9 + new_coord.x] = move
+            return move
+        return _make_move(QuoridorMoveType.MOVE, new_coord, None, player)
 
     def add_fence(fence, player):
-        move = QuoridorMove()
-        move.type = QuoridorMoveType.FENCE
-        move.coord = fence.first
-        move.is_horizontal = fence.is_horizontal
-        move.player = player
-        return move
+        return _fence_move(fence.first, fence.is_horizontal, player)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("QuoridorMove is immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (_unpickle_move, (self.type.value, self.coord.x, self.coord.y, self.is_horizontal, self.player))
 
     def execute(self, board):
         if self.type == QuoridorMoveType.MOVE:
@@ -33,5 +48,48 @@ class QuoridorMove(object):
         else:
             raise Exception("Impossible move!")
 
+    # Moves are equal if they do the same thing for the same player
+    def key(self):
+        return self._key
+
+    def __eq__(self, other):
+        return self is other or (isinstance(other, QuoridorMove) and self._key == other._key)
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        if self.type == QuoridorMoveType.MOVE:
+            return "QuoridorMove(player %i moves to %i, %i)" % (self.player, self.coord.x, self.coord.y)
+        return "QuoridorMove(player %i %s fence at %i, %i)" % (self.player, "horizontal" if self.is_horizontal else "vertical", self.coord.x, self.coord.y)
+
+MAX_PLAYERS = 4
+
+# Shared moves: _PAWN_MOVES[player][y * 9 + x], _FENCE_MOVES[(player, is_horizontal, x, y)]
+_PAWN_MOVES = [[None] * 81 for player in range(MAX_PLAYERS)]
+_FENCE_MOVES = {}
+
+def _make_move(type, coord, is_horizontal, player):
+    move = object.__new__(QuoridorMove)
+    object.__setattr__(move, "type", type)
+    object.__setattr__(move, "coord", coord)
+    object.__setattr__(move, "is_horizontal", is_horizontal)
+    object.__setattr__(move, "player", player)
+    key = (type, coord.x, coord.y, is_horizontal, player)
+    object.__setattr__(move, "_key", key)
+    object.__setattr__(move, "_hash", hash(key))
+    return move
 
+def _unpickle_move(type_value, x, y, is_horizontal, player):
+    if type_value == QuoridorMoveType.MOVE.value:
+        return QuoridorMove.move_pawn(Coordinate(x, y), player)
+    return _fence_move(Coordinate(x, y), is_horizontal, player)
 
+def _fence_move(coord, is_horizontal, player):
+    key = (player, is_horizontal, coord.x, coord.y)
+    move = _FENCE_MOVES.get(key)
+    if move is None:
+        move = _make_move(QuoridorMoveType.FENCE, coord, is_horizontal, player)
+        if 0 <= coord.x < 9 and 0 <= coord.y < 9 and 0 <= player < MAX_PLAYERS:
+            _FENCE_MOVES[key] = move
+    return move
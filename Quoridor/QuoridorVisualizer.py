@@ -1,7 +1,3 @@
-import pygame
-from Coordinate import Coordinate
-pygame.init()
-
 BLACK = 0,0,0
 PLAYER1 = 255,0,0
 PLAYER2 = 0,0,255
@@ -17,10 +13,42 @@ COLORS = [PLAYER1, PLAYER2, PLAYER3, PLAYER4]
 
 ROWS = 9
 
-pygame.font.init()
+# Set by load_pygame, so importing this module doesn't start SDL
+pygame = None
+
+# Import and initialise pygame the first time a window is needed
+def load_pygame():
+    global pygame
+    if pygame is None:
+        import pygame as module
+        module.init()
+        module.font.init()
+        pygame = module
+    return pygame
+
+# Fonts by (name, size), loaded once
+FONTS = {}
+
+def get_font(name, size):
+    font = FONTS.get((name, size))
+    if font is None:
+        font = pygame.font.SysFont(name, size)
+        FONTS[(name, size)] = font
+    return font
 
 class QuoridorVisualizer:
+    """
+    Draws boards in a pygame window.
+
+    The black screen with the grid is drawn once onto a background surface.
+    Each frame copies the background back over the areas the last frame drew
+    on, draws the pawns, fences, highlights and text on top, and only sends
+    those areas to the display. A frame that shows the same thing as the
+    last one isn't drawn at all.
+    """
+
     def __init__(self, width=640, height=480):
+        load_pygame()
         self.screen = pygame.display.set_mode((width, height))
 
         self.width = width
@@ -32,80 +60,117 @@ class QuoridorVisualizer:
 
         self.game_closed = False
 
+        self.font = get_font("Calibri", 12)
+        # Rendered text by (string, color)
+        self.texts = {}
+        self.background = self.draw_background()
+        # Areas drawn on by the last frame, None until the first frame is shown
+        self.dirty = None
+        self.last_frame = None
+        # Set by HumanPlayer while it reads keys; otherwise draw_board throws away events nobody reads
+        self.reading_input = False
+
+    def draw_background(self):
+        background = pygame.Surface((self.width, self.height))
+        background.fill(BLACK)
+        for row_num in range(0, 10):
+            row_start = (self.left_disp_offset, self.top_disp_offset + (self.box_size * row_num))
+            row_end = (self.left_disp_offset + (self.box_size * 9), self.top_disp_offset + (self.box_size * row_num))
+            pygame.draw.line(background, WHITE, row_start, row_end)
+        for col_num in range(0, 10):
+            col_start = (self.left_disp_offset + (self.box_size * col_num), self.top_disp_offset)
+            col_end = (self.left_disp_offset + (self.box_size * col_num), self.top_disp_offset + (self.box_size * 9))
+            pygame.draw.line(background, WHITE, col_start, col_end)
+        return background
 
     def draw_board(self, canonical_board, potential_moves = [], current_space = [], potential_fences = [], current_fence = []):
-        if not self.game_closed:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.game_closed = True
-                    pygame.quit()
-
-            # Reset screen
-            self.screen.fill(BLACK)
-
-            # Drawing the grid
-            for row_num in range(0, 10):
-                row_start = (self.left_disp_offset, self.top_disp_offset + (self.box_size * row_num))
-                row_end = (self.left_disp_offset + (self.box_size * 9), self.top_disp_offset + (self.box_size * row_num))
-                pygame.draw.line(self.screen, WHITE, row_start, row_end)
-            for col_num in range(0, 10):
-                col_start = (self.left_disp_offset + (self.box_size * col_num), self.top_disp_offset)
-                col_end = (self.left_disp_offset + (self.box_size * col_num), self.top_disp_offset + (self.box_size * 9))
-                #if col_num > 0:
-                #    col_label = my_font.render(str(col_num), 1, WHITE)
-                #    self.screen.blit(col_label, (self.left_disp_offset + (self.box_size * col_num) - self.box_size / 2, self.height - 40))
-                pygame.draw.line(self.screen, WHITE, col_start, col_end)
-
-            color = COLORS[canonical_board.current_player]
-            highlight_color = color[0] / 2, color[1] / 2, color[2] / 2
-
-            # Drawing potential squares
-            for position in potential_moves:
-                pygame.draw.rect(self.screen, highlight_color, pygame.Rect(int(self.box_size * position.coord.x) + self.left_disp_offset + 1, int(self.box_size * position.coord.y) + self.top_disp_offset + 1, self.box_size - 1, self.box_size - 1))
-
-            # Drawing current cursor position for move
-            for position in current_space:
-                pygame.draw.rect(self.screen, HIGHLIGHT, pygame.Rect(int(self.box_size * position.coord.x) + self.left_disp_offset + 1, int(self.box_size * position.coord.y) + self.top_disp_offset + 1, self.box_size - 1, self.box_size - 1))
-
-            # Drawing pieces
-            for i in range(len(canonical_board.pawns)):
-                pawn = canonical_board.pawns[i]
-                pos = (int(self.box_size * (pawn.x + 0.5)) + self.left_disp_offset + 1,
-                        int(self.box_size * (pawn.y + 0.5)) + self.top_disp_offset + 1)
-                pygame.draw.circle(self.screen, COLORS[i], pos, self.radius - 1)
-
-            # Draw potential fences
-            for fence in potential_fences:
-                self.draw_fence(fence.coord, fence.is_horizontal, highlight_color)
-    
-            # Drawing fences
-            for fence in canonical_board.horizontal_fences:
-                self.draw_fence(fence.first, fence.is_horizontal, FENCE_COLOR)
-            for fence in canonical_board.vertical_fences:
-                self.draw_fence(fence.first, fence.is_horizontal, FENCE_COLOR)
-
-            # Draw current potential fence
-            for fence in current_fence:
-                self.draw_fence(fence.coord, fence.is_horizontal, HIGHLIGHT)
-
-            # Display information on the side:
-
-    
-            string = "Current player: %i" % (canonical_board.current_player + 1)
-            position = Coordinate(self.left_disp_offset + (self.box_size * (ROWS + .5)), self.height * .2)
-            self.draw_string(string, color, position)
-            for i_player, n_fences in enumerate(canonical_board.fences):
-                string = "Player %i: %i fences left" % (i_player + 1, n_fences)
-                position.y += self.height * .05
-                self.draw_string(string, COLORS[i_player], position)
+        if self.game_closed:
+            return
+        # Window close events are always handled; the rest are only kept while a HumanPlayer reads them,
+        # so the queue doesn't fill up and drop a later close
+        if pygame.event.get(pygame.QUIT):
+            self.close()
+            return
+        if not self.reading_input:
+            pygame.event.clear()
+
+        frame = (tuple(canonical_board.pawns), tuple(canonical_board.horizontal_fences), tuple(canonical_board.vertical_fences),
+                 canonical_board.current_player, tuple(canonical_board.fences),
+                 tuple(potential_moves), tuple(current_space), tuple(potential_fences), tuple(current_fence))
+        if frame == self.last_frame:
+            return
+        self.last_frame = frame
+
+        # Put the background back wherever the last frame drew
+        if self.dirty is None:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            for rect in self.dirty:
+                self.screen.blit(self.background, rect, rect)
+        drawn = []
+
+        color = COLORS[canonical_board.current_player]
+        highlight_color = color[0] / 2, color[1] / 2, color[2] / 2
+
+        # Drawing potential squares
+        for position in potential_moves:
+            drawn.append(self.draw_square(position.coord, highlight_color))
+
+        # Drawing current cursor position for move
+        for position in current_space:
+            drawn.append(self.draw_square(position.coord, HIGHLIGHT))
+
+        # Drawing pieces
+        for i in range(len(canonical_board.pawns)):
+            pawn = canonical_board.pawns[i]
+            pos = (int(self.box_size * (pawn.x + 0.5)) + self.left_disp_offset + 1,
+                    int(self.box_size * (pawn.y + 0.5)) + self.top_disp_offset + 1)
+            drawn.append(pygame.draw.circle(self.screen, COLORS[i], pos, self.radius - 1))
+
+        # Draw potential fences
+        for fence in potential_fences:
+            drawn.append(self.draw_fence(fence.coord, fence.is_horizontal, highlight_color))
+
+        # Drawing fences
+        for fence in canonical_board.horizontal_fences:
+            drawn.append(self.draw_fence(fence.first, fence.is_horizontal, FENCE_COLOR))
+        for fence in canonical_board.vertical_fences:
+            drawn.append(self.draw_fence(fence.first, fence.is_horizontal, FENCE_COLOR))
+
+        # Draw current potential fence
+        for fence in current_fence:
+            drawn.append(self.draw_fence(fence.coord, fence.is_horizontal, HIGHLIGHT))
+
+        # Display information on the side:
+        string = "Current player: %i" % (canonical_board.current_player + 1)
+        text_x = self.left_disp_offset + (self.box_size * (ROWS + .5))
+        text_y = self.height * .2
+        drawn.append(self.draw_string(string, color, (text_x, text_y)))
+        for i_player, n_fences in enumerate(canonical_board.fences):
+            string = "Player %i: %i fences left" % (i_player + 1, n_fences)
+            text_y += self.height * .05
+            drawn.append(self.draw_string(string, COLORS[i_player], (text_x, text_y)))
+
+        if self.dirty is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.dirty + drawn)
+        self.dirty = drawn
 
+    def close(self):
+        if not self.game_closed:
+            self.game_closed = True
+            pygame.quit()
 
-            pygame.display.flip()
+    def draw_square(self, coord, color):
+        return pygame.draw.rect(self.screen, color, pygame.Rect(int(self.box_size * coord.x) + self.left_disp_offset + 1, int(self.box_size * coord.y) + self.top_disp_offset + 1, self.box_size - 1, self.box_size - 1))
 
     def draw_string(self, string, color, position):
-        my_font = pygame.font.SysFont("Calibri", 12)
-        text = my_font.render(string, 1, color)
-        self.screen.blit(text, (position.x, position.y))
+        text = self.texts.get((string, color))
+        if text is None:
+            text = self.font.render(string, 1, color)
+            self.texts[(string, color)] = text
+        return self.screen.blit(text, position)
 
     def draw_fence(self, coord, is_horizontal, color):
         second_x = coord.x
@@ -118,4 +183,4 @@ class QuoridorVisualizer:
                 int(self.box_size * coord.y) + self.top_disp_offset)
         pos2 = (int(self.box_size * second_x) + self.left_disp_offset,
                 int(self.box_size * second_y) + self.top_disp_offset)
-        pygame.draw.line(self.screen, color, pos1, pos2, FENCE_WIDTH)
\ No newline at end of file
+        return pygame.draw.line(self.screen, color, pos1, pos2, FENCE_WIDTH)
@@ -0,0 +1,94 @@
+class ReachabilityCache:
+    """
+    Remembers a path to the goal for every player between moves.
+
+    A candidate fence can only cut a player off if it blocks one of the edges
+    their current path uses, so the full search in check_if_possible is only
+    needed for the handful of fences that touch the cached path.
+    """
+
+    def __init__(self):
+        # player -> (path, cells on the path, fence position -> first step of the path it cuts)
+        self.paths = {}
+
+    # Entries are never changed once made, so a copy can share them
+    def __deepcopy__(self, memo):
+        cache = ReachabilityCache()
+        cache.paths = dict(self.paths)
+        return cache
+
+    # Forget every cached path
+    def invalidate(self):
+        self.paths = {}
+
+    # Cached entry for a player, searching for a new path if needed
+    # Returns None if the player can't reach their goal
+    def entry(self, board, player):
+        entry = self.paths.get(player)
+        if entry is None:
+            path = board.get_shortest_path(player)
+            if path is None:
+                return None
+            entry = (path, set((coord.x, coord.y) for coord in path), cutting_fences(path))
+            self.paths[player] = entry
+        return entry
+
+    # A shortest path to the goal for a player, starting at their pawn, or None
+    def path(self, board, player):
+        entry = self.entry(board, player)
+        return entry[0] if entry is not None else None
+
+    # Fence positions (is_horizontal, x, y) that block a player's path, mapped
+    # to the first step of the path they block
+    def cuts(self, board, player):
+        entry = self.entry(board, player)
+        return entry[2] if entry is not None else {}
+
+    # Check if a fence at (is_horizontal, x, y) blocks the cached path of a player
+    def path_cut(self, board, player, is_horizontal, x, y):
+        entry = self.entry(board, player)
+        if entry is None:
+            return True
+        return (is_horizontal, x, y) in entry[2]
+
+    # Drop the paths a newly placed fence cuts through
+    def fence_added(self, is_horizontal, x, y):
+        key = (is_horizontal, x, y)
+        for player in [player for player, entry in self.paths.items() if key in entry[2]]:
+            del self.paths[player]
+
+    # Drop the paths whose moves depend on the squares a pawn left or entered
+    def pawn_moved(self, player, old_coord, new_coord):
+        self.paths.pop(player, None)
+        for other in list(self.paths):
+            for x, y in self.paths[other][1]:
+                if abs(x - old_coord.x) + abs(y - old_coord.y) <= 2 or abs(x - new_coord.x) + abs(y - new_coord.y) <= 2:
+                    del self.paths[other]
+                    break
+
+# Fence positions that block at least one move along a path, mapped to the first step they block
+def cutting_fences(path):
+    cuts = {}
+    for step, (current, new_coord) in enumerate(zip(path, path[1:])):
+        dx = new_coord.x - current.x
+        dy = new_coord.y - current.y
+        if abs(dx) + abs(dy) == 1:
+            edges = [(current.x, current.y, new_coord.x, new_coord.y)]
+        elif dx == 0 or dy == 0:
+            mid_x = current.x + dx // 2
+            mid_y = current.y + dy // 2
+            edges = [(current.x, current.y, mid_x, mid_y), (mid_x, mid_y, new_coord.x, new_coord.y)]
+        else:
+            # Diagonal jump, over whichever pawn was in the way
+            edges = [(current.x, current.y, current.x, new_coord.y), (current.x, new_coord.y, new_coord.x, new_coord.y),
+                     (current.x, current.y, new_coord.x, current.y), (new_coord.x, current.y, new_coord.x, new_coord.y)]
+        for x1, y1, x2, y2 in edges:
+            if x1 == x2:
+                y = max(y1, y2)
+                cuts.setdefault((True, x1, y), step)
+                cuts.setdefault((True, x1 - 1, y), step)
+            else:
+                x = max(x1, x2)
+                cuts.setdefault((False, x, y1), step)
+                cuts.setdefault((False, x, y1 - 1), step)
+    return cuts
@@ -0,0 +1,191 @@
+"""
+Symmetries of the Quoridor board, and canonical position hashes.
+
+With two players the board can be mirrored left to right, and turned half
+way round if the players swap seats, since each then starts where the other
+did and heads for the other's goal. Together with the identity and doing
+both, that makes four symmetries. With four players the mirror would swap
+two seats and so reverse the turn order, which changes the game; turning the
+board a quarter round and moving every seat back one does not, so the four
+symmetries are the quarter turns.
+
+A symmetry is given by where it sends the fence corner points; where squares,
+fences, pawn steps and actions go all follow from that. Every position and
+its images under the symmetries are the same game, so caches can key them
+all on canonical_hash, the smallest Zobrist hash among them, and store moves
+mapped by the symmetry canonical returns with it.
+"""
+
+import numpy as np
+
+import QuoridorActions
+import Zobrist
+from Coordinate import Coordinate
+from QuoridorBoard import Fence, FENCE_SLOTS, N_FENCE_SLOTS, N_CELLS, fence_slot
+from QuoridorMove import QuoridorMove, QuoridorMoveType
+
+class Symmetry():
+    """
+    One symmetry of the board.
+
+    corner maps a fence corner point (cx, cy), 0 <= cx, cy <= 9, to its image
+    and seats[player] is the seat a player's pawn takes in the image.
+    """
+
+    def __init__(self, name, corner, seats):
+        self.name = name
+        self.corner = corner
+        self.seats = seats
+        self.is_identity = all(corner(cx, cy) == (cx, cy) for cx in range(10) for cy in range(10)) and seats == sorted(seats)
+        # Image of each square, by cell number
+        self.cells = []
+        for cell in range(N_CELLS):
+            x, y = cell % 9, cell // 9
+            (ax, ay), (bx, by) = corner(x, y), corner(x + 1, y + 1)
+            self.cells.append(min(ay, by) * 9 + min(ax, bx))
+        # Image of each fence, by fence slot
+        self.fences = []
+        for slot in range(N_FENCE_SLOTS):
+            fence = FENCE_SLOTS[slot]
+            x, y = fence.first.x, fence.first.y
+            (ax, ay), (bx, by) = corner(x, y), corner(x + 2, y) if fence.is_horizontal else corner(x, y + 2)
+            self.fences.append(Fence(Coordinate(min(ax, bx), min(ay, by)), ay == by))
+        # Image of each action; pawn steps turn with the board
+        ox, oy = corner(0, 0)
+        self.actions = np.empty(QuoridorActions.ACTION_SIZE, dtype=np.intp)
+        for action, (dx, dy) in enumerate(QuoridorActions.PAWN_OFFSETS):
+            cx, cy = corner(dx, dy)
+            self.actions[action] = QuoridorActions.OFFSET_ACTIONS[(cx - ox, cy - oy)]
+        for action in range(QuoridorActions.HORIZONTAL_BASE, QuoridorActions.ACTION_SIZE):
+            is_horizontal, x, y = QuoridorActions.ACTION_FENCES[action - QuoridorActions.HORIZONTAL_BASE]
+            fence = self.fences[fence_slot(Fence(Coordinate(x, y), is_horizontal))]
+            self.actions[action] = QuoridorActions.fence_action(fence.is_horizontal, fence.first.x, fence.first.y)
+        # Zobrist keys of the image of each feature, so the image's hash needs no image
+        self.pawn_keys = [[Zobrist.PAWN_KEYS[seat][self.cells[cell]] for cell in range(N_CELLS)] for seat in seats]
+        self.fence_keys = [Zobrist.fence_key(fence.first, fence.is_horizontal) for fence in self.fences]
+        self.fences_left_keys = [Zobrist.FENCES_LEFT_KEYS[seat] for seat in seats]
+        self.side_keys = [Zobrist.SIDE_KEYS[seat] for seat in seats]
+        self.inverse = None
+
+    def __repr__(self):
+        return "Symmetry(%s)" % self.name
+
+    def coord(self, coord):
+        cell = self.cells[coord.y * 9 + coord.x]
+        return Coordinate(cell % 9, cell // 9)
+
+    def fence(self, fence):
+        return self.fences[fence_slot(fence)]
+
+    def move(self, move):
+        if move.type == QuoridorMoveType.MOVE:
+            return QuoridorMove.move_pawn(self.coord(move.coord), self.seats[move.player])
+        return QuoridorMove.add_fence(self.fence(Fence(move.coord, move.is_horizontal)), self.seats[move.player])
+
+    def action(self, action):
+        return int(self.actions[action])
+
+    # A policy over QuoridorActions, moved to the actions of the image
+    def policy(self, pi):
+        pi = np.asarray(pi)
+        image = np.empty_like(pi)
+        image[self.actions] = pi
+        return image
+
+    # Zobrist hash of the image of board, as the image would have it
+    def hash(self, board):
+        h = self.side_keys[board.current_player]
+        for player, pawn in enumerate(board.pawns):
+            h ^= self.pawn_keys[player][pawn.y * 9 + pawn.x]
+        for player, count in enumerate(board.fences):
+            h ^= self.fences_left_keys[player][count]
+        fence_keys = self.fence_keys
+        for fence in board.horizontal_fences:
+            h ^= fence_keys[fence_slot(fence)]
+        for fence in board.vertical_fences:
+            h ^= fence_keys[fence_slot(fence)]
+        return h
+
+    # A new board of the same kind set up as the image of board
+    # The image has no moves to undo
+    def board(self, board):
+        n_players = len(board.pawns)
+        image = type(board)(n_players)
+        image.check_possible = board.check_possible
+        for player, pawn in enumerate(board.pawns):
+            image.restore_pawn(self.seats[player], self.coord(pawn))
+        # A pawn moved onto a square another had not yet left got its square cleared; mark them all again
+        for seat, pawn in enumerate(image.pawns):
+            image.restore_pawn(seat, pawn)
+        # Fences don't belong to anybody, so they are taken from whoever has most left and the counts set after
+        for fence in board.horizontal_fences + board.vertical_fences:
+            fence = self.fence(fence)
+            image.add_fence(image.fences.index(max(image.fences)), fence.first, fence.is_horizontal)
+        for player, count in enumerate(board.fences):
+            image.fences[self.seats[player]] = count
+        image.current_player = self.seats[board.current_player]
+        image.ply = board.ply
+        image.reachability.invalidate()
+        image.hash = Zobrist.board_hash(image)
+        return image
+
+# corner(cx, cy) of each symmetry
+def identity(cx, cy):
+    return cx, cy
+
+def mirror(cx, cy):
+    return 9 - cx, cy
+
+def half_turn(cx, cy):
+    return 9 - cx, 9 - cy
+
+def mirror_half_turn(cx, cy):
+    return cx, 9 - cy
+
+def quarter_turn(cx, cy):
+    return 9 - cy, cx
+
+def three_quarter_turn(cx, cy):
+    return cy, 9 - cx
+
+SYMMETRIES = {
+    2: [Symmetry("identity", identity, [0, 1]),
+        Symmetry("mirror", mirror, [0, 1]),
+        Symmetry("half turn", half_turn, [1, 0]),
+        Symmetry("mirrored half turn", mirror_half_turn, [1, 0])],
+    # A quarter turn takes each seat's start and goal to those of the seat before it
+    4: [Symmetry("identity", identity, [0, 1, 2, 3]),
+        Symmetry("quarter turn", quarter_turn, [3, 0, 1, 2]),
+        Symmetry("half turn", half_turn, [2, 3, 0, 1]),
+        Symmetry("three quarter turn", three_quarter_turn, [1, 2, 3, 0])],
+}
+
+for _symmetries in SYMMETRIES.values():
+    for _symmetry in _symmetries:
+        _symmetry.inverse = next(other for other in _symmetries
+                                 if [_symmetry.cells[cell] for cell in other.cells] == list(range(N_CELLS))
+                                 and [_symmetry.seats[seat] for seat in other.seats] == sorted(other.seats))
+
+def symmetries(board):
+    return SYMMETRIES[len(board.pawns)]
+
+# (hash, symmetry) of the canonical image of board: the image with the smallest hash
+# A move on board is symmetry.move(move) on the canonical image, and symmetry.inverse.move takes it back
+def canonical(board):
+    best_hash = board.hash
+    best = SYMMETRIES[len(board.pawns)][0]
+    for symmetry in SYMMETRIES[len(board.pawns)][1:]:
+        h = symmetry.hash(board)
+        if h < best_hash:
+            best_hash = h
+            best = symmetry
+    return best_hash, best
+
+# Zobrist hash of the canonical image of board, the same for every position symmetric to it
+def canonical_hash(board):
+    return canonical(board)[0]
+
+# Every symmetry that takes board to its canonical image; more than one if the position is symmetric itself
+def canonical_symmetries(board):
+    best_hash = canonical_hash(board)
+    return [symmetry for symmetry in SYMMETRIES[len(board.pawns)] if symmetry.hash(board) == best_hash]
@@ -0,0 +1,98 @@
+from collections import namedtuple
+
+# How the value stored for a position relates to its true value
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Replacement policies
+ALWAYS_REPLACE = "always"
+DEPTH_PREFERRED = "depth"
+TWO_TIER = "two-tier"
+
+# age is the search that stored the entry, counted by new_search
+TTEntry = namedtuple("TTEntry", ["key", "depth", "value", "flag", "move", "age"])
+
+class TranspositionTable:
+    """
+    Fixed size table of search results keyed by Zobrist hash.
+
+    Positions are stored at index hash % size, so memory stays bounded no
+    matter how long the search runs. When two positions want the same index
+    the replacement policy decides which one is kept:
+        always:   the newest result wins
+        depth:    the result from the deeper search wins
+        two-tier: each index has a depth-preferred entry and an always-replace
+                  entry, so shallow recent results don't evict deep ones
+
+    Depth only protects an entry during the search that stored it. Call
+    new_search before each search: entries from earlier searches can still be
+    found, but any new result may replace them, so deep results for positions
+    that can no longer occur don't hold their slots for the rest of the game.
+    """
+
+    def __init__(self, size = 1 << 20, policy = DEPTH_PREFERRED):
+        if policy not in (ALWAYS_REPLACE, DEPTH_PREFERRED, TWO_TIER):
+            raise Exception("Unknown replacement policy: %s" % policy)
+        self.size = size
+        self.policy = policy
+        self.deep = [None] * size
+        self.recent = [None] * size if policy == TWO_TIER else None
+        self.age = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    # Find the entry for a position, or None if it isn't stored
+    def lookup(self, key):
+        index = key % self.size
+        entry = self.deep[index]
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        if self.recent is not None:
+            entry = self.recent[index]
+            if entry is not None and entry.key == key:
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    # Store the result of searching a position to depth
+    def store(self, key, depth, value, flag, move = None):
+        index = key % self.size
+        entry = TTEntry(key, depth, value, flag, move, self.age)
+        self.stores += 1
+        current = self.deep[index]
+        if current is None or current.key == key:
+            self.deep[index] = entry
+        elif self.policy == ALWAYS_REPLACE or current.age != self.age or depth >= current.depth:
+            self.overwrites += 1
+            if self.recent is not None:
+                # The deep entry moves down a tier instead of being lost
+                self.recent[index] = current
+            self.deep[index] = entry
+        elif self.recent is not None:
+            self.recent[index] = entry
+
+    # Start a new search; entries stored before it lose their claim to their slots
+    def new_search(self):
+        self.age += 1
+
+    # Empty the table
+    def clear(self):
+        self.deep = [None] * self.size
+        if self.recent is not None:
+            self.recent = [None] * self.size
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    # Number of positions currently stored
+    def __len__(self):
+        count = sum(1 for entry in self.deep if entry is not None)
+        if self.recent is not None:
+            count += sum(1 for entry in self.recent if entry is not None)
+        return count
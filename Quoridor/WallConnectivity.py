@@ -0,0 +1,108 @@
+"""
+Union-find over fence corners, to tell which fences can't cut a player off.
+
+Think of the fences, the edge of the board and the squares of the other
+pawns as obstacles in the plane. A new fence can only split the free squares
+into more pieces if it closes a loop of obstacles, which happens only if two
+of its three corner points already belong to the same connected group of
+obstacles. So with a union-find over the 10 x 10 corner points, three finds
+tell if a fence may disconnect anything.
+
+A pawn's moves are steps to free neighbouring squares, plus jumps over other
+pawns. If a player can get to their goal through free squares before the new
+fence, and the fence closes no loop, they still can afterwards with plain
+steps, so their path check can be skipped. Everything else still goes through
+the full, pawn-aware search, so the legal fences are exactly the same.
+"""
+
+from DistanceField import GOAL_BITS
+from FloodFill import PositionCache, all_reach_goals, pawn_cells
+
+# Corner (cx, cy), 0 <= cx, cy <= 9, is numbered cy * 10 + cx
+N_CORNERS = 100
+
+def corner(cx, cy):
+    return cy * 10 + cx
+
+# The three corner points a fence at (is_horizontal, x, y) runs through
+def fence_corners(is_horizontal, x, y):
+    if is_horizontal:
+        return corner(x, y), corner(x + 1, y), corner(x + 2, y)
+    return corner(x, y), corner(x, y + 1), corner(x, y + 2)
+
+# Union-find parents with the edge of the board already joined into one group
+BORDER_PARENTS = [corner(0, 0) if cx in (0, 9) or cy in (0, 9) else corner(cx, cy) for cy in range(10) for cx in range(10)]
+
+def find(parents, node):
+    root = node
+    while parents[root] != root:
+        root = parents[root]
+    while parents[node] != root:
+        parents[node], node = root, parents[node]
+    return root
+
+def union(parents, a, b):
+    a = find(parents, a)
+    b = find(parents, b)
+    if a != b:
+        parents[b] = a
+
+# Group the corners of the obstacles a player's pawn faces: the edge of the board,
+# the fences and the squares of the other pawns
+def obstacle_groups(board, player):
+    parents = list(BORDER_PARENTS)
+    for fence in board.horizontal_fences:
+        first, middle, last = fence_corners(True, fence.first.x, fence.first.y)
+        union(parents, first, middle)
+        union(parents, middle, last)
+    for fence in board.vertical_fences:
+        first, middle, last = fence_corners(False, fence.first.x, fence.first.y)
+        union(parents, first, middle)
+        union(parents, middle, last)
+    for other, pawn in enumerate(board.pawns):
+        if other != player:
+            top_left = corner(pawn.x, pawn.y)
+            union(parents, top_left, top_left + 1)
+            union(parents, top_left, top_left + 10)
+            union(parents, top_left, top_left + 11)
+    return parents
+
+# Check if a player's pawn can reach their goal by steps through squares no other pawn is on
+# The same flood fill as the fence path checks, with the other pawns in the way and no jumps
+def free_path(board, player):
+    pawn = board.pawns[player]
+    start = pawn.y * 9 + pawn.x
+    open_south, open_east = board.edge_masks()
+    others = pawn_cells(board.pawns) & ~(1 << start)
+    return all_reach_goals([start], [GOAL_BITS[len(board.pawns)][player]], open_south, open_east, others, [])
+
+class WallConnectivity(PositionCache):
+    """
+    Tells which fences can't cut a player off, keeping the obstacle groups
+    and free path check of each player in each position it has seen.
+
+    skipped and checked count the fences may_cut_off cleared without a search
+    and those it left to the full search.
+    """
+
+    def __init__(self, max_entries = 1 << 12):
+        super().__init__(max_entries)
+        self.skipped = 0
+        self.checked = 0
+
+    # (obstacle groups, free path) of a player in the current position
+    def compute(self, board, player):
+        return (obstacle_groups(board, player), free_path(board, player))
+
+    # Check if a fence at (is_horizontal, x, y) could stop a player reaching their goal
+    # False means it certainly can't; True means the full search has to decide
+    def may_cut_off(self, board, player, is_horizontal, x, y):
+        parents, has_free_path = self.entry(board, player)
+        if has_free_path:
+            first, middle, last = fence_corners(is_horizontal, x, y)
+            first, middle, last = find(parents, first), find(parents, middle), find(parents, last)
+            if first != middle and middle != last and first != last:
+                self.skipped += 1
+                return False
+        self.checked += 1
+        return True
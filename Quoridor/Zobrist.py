@@ -0,0 +1,56 @@
+"""
+Zobrist keys for Quoridor positions.
+
+A position hash is the XOR of one random 64 bit key per feature: each pawn on
+its square, each placed fence, each player's remaining fence count and the
+player to move. Any change to the board is undone or applied by XORing the
+keys of the features that changed, so QuoridorBoard keeps its hash up to date
+in constant time per move.
+"""
+
+import random
+
+# Fixed seed so hashes are the same in every process and every run
+_rng = random.Random(0x5EED)
+
+def _key():
+    return _rng.getrandbits(64)
+
+MAX_PLAYERS = 4
+MAX_FENCES = 10
+
+PAWN_KEYS = [[_key() for cell in range(81)] for player in range(MAX_PLAYERS)]
+# FENCE_KEYS[is_horizontal][x][y]
+FENCE_KEYS = [[[_key() for y in range(9)] for x in range(9)] for is_horizontal in range(2)]
+FENCES_LEFT_KEYS = [[_key() for count in range(MAX_FENCES + 1)] for player in range(MAX_PLAYERS)]
+SIDE_KEYS = [_key() for player in range(MAX_PLAYERS)]
+# Searches that score positions for one seat mix in that seat's key, made last so the keys above don't change
+ROOT_KEYS = [_key() for player in range(MAX_PLAYERS)]
+
+def pawn_key(player, coord):
+    return PAWN_KEYS[player][coord.y * 9 + coord.x]
+
+def fence_key(coord, is_horizontal):
+    return FENCE_KEYS[is_horizontal][coord.x][coord.y]
+
+def fences_left_key(player, count):
+    return FENCES_LEFT_KEYS[player][count]
+
+def side_key(player):
+    return SIDE_KEYS[player]
+
+def root_key(player):
+    return ROOT_KEYS[player]
+
+# Hash a board from scratch
+def board_hash(board):
+    h = side_key(board.current_player)
+    for player, pawn in enumerate(board.pawns):
+        h ^= pawn_key(player, pawn)
+    for player, count in enumerate(board.fences):
+        h ^= fences_left_key(player, count)
+    for fence in board.horizontal_fences:
+        h ^= fence_key(fence.first, True)
+    for fence in board.vertical_fences:
+        h ^= fence_key(fence.first, False)
+    return h
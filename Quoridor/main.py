@@ -17,7 +17,7 @@ rp = RandomPlayer(g).play
 hp = HumanPlayer(g).play
 yp = YOURNAMESPlayer(g).play
 
-players = [hp, yp, rp, rp]
+players = [hp, yp]
 arena = Arena(players, g)
 
 
@@ -25,9 +25,9 @@ result = arena.playGame(verbose=True)
 print ("Player %i won!" % (result + 1))
 
 """
-p1wins, p2wins, draws, average_times = arena.playGames(num=10, verbose=True)
+results = arena.playGames(num=10, processes=1, verbose=True)
 
-print('P1 won', p1wins, 'times')
-print('P2 won', p2wins, 'times')
-print('Draw', draws, 'times')
+for i_player, (wins, interval) in enumerate(zip(results["wins"], results["confidence_intervals"])):
+    print('P%i won' % (i_player + 1), wins, 'times, win rate 95%% CI %.2f - %.2f' % interval)
+print('Draw', results["draws"], 'times')
 """